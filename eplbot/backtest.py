@@ -0,0 +1,177 @@
+from __future__ import annotations
+from typing import Any, Dict, List, Tuple
+import math, os, tempfile, time
+from .league import League
+
+# Backtest: phát lại một mùa đã xong theo thứ tự ngày, mỗi "matchweek" chạy kiểm tra Official (ILP) +
+# mô phỏng như pipeline thật, rồi so dự báo với bảng cuối mùa (Brier / log-loss) và đo thời gian, bộ nhớ.
+# Tái dùng giữa các matchweek: cờ Official đã đúng thì giữ nguyên (thêm kết quả không thể làm mất cờ),
+# ma trận sims được giữ trong store incremental. Cache xác suất dùng chung chỉ dùng khi được yêu cầu
+# (cache=...): khi đó mô phỏng không qua store để lần chạy lại lấy thẳng từ cache.
+
+STAGES = (("early", 0, 120), ("mid", 120, 250), ("late", 250, 381))  # by results played
+
+def season_steps(rows: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+    """Split a season into matchweek steps, replayed in date order.
+
+    With matchdays, a step ends whenever another matchday becomes complete (postponed games land in the
+    step where they were actually played). Without them, steps are blocks of 10 results by date (file
+    order if there are no dates either)."""
+    rows = sorted(rows, key=lambda r: r.get("utcDate") or "") if all(r.get("utcDate") for r in rows) else list(rows)
+    if not all(r.get("matchday") is not None for r in rows):
+        return [rows[i:i + 10] for i in range(0, len(rows), 10)]
+    left: Dict[int, int] = {}
+    for r in rows:
+        left[r["matchday"]] = left.get(r["matchday"], 0) + 1
+    steps, cur = [], []
+    for r in rows:
+        cur.append(r)
+        left[r["matchday"]] -= 1
+        if left[r["matchday"]] == 0:
+            steps.append(cur)
+            cur = []
+    if cur:
+        steps.append(cur)
+    return steps
+
+def final_outcome(L: League) -> Tuple[Dict[str, int], Dict[str, int]]:
+    """Actual top-4 / safe (not bottom 3) indicators from the final table."""
+    order = [s.team for s in L.table_view()]
+    return ({t: int(i < 4) for i, t in enumerate(order)}, {t: int(i < len(order) - 3) for i, t in enumerate(order)})
+
+def brier(p: List[float], y: List[int]) -> float:
+    return sum((a - b) ** 2 for a, b in zip(p, y)) / len(p)
+
+def log_loss(p: List[float], y: List[int], eps: float) -> float:
+    """eps clips Monte Carlo zeros/ones (half a simulation) so one unlucky 0 doesn't dominate."""
+    s = 0.0
+    for a, b in zip(p, y):
+        a = min(max(a, eps), 1 - eps)
+        s -= math.log(a) if b else math.log(1 - a)
+    return s / len(p)
+
+def reliability(p: List[float], y: List[int], bins: int = 10) -> List[Dict[str, Any]]:
+    out = []
+    for k in range(bins):
+        lo, hi = k / bins, (k + 1) / bins
+        idx = [i for i, a in enumerate(p) if lo <= a < hi or (k == bins - 1 and a == 1.0)]
+        if idx:
+            out.append({"bin": f"{lo:.1f}-{hi:.1f}", "n": len(idx), "mean_p": sum(p[i] for i in idx) / len(idx),
+                        "observed": sum(y[i] for i in idx) / len(idx)})
+    return out
+
+def _rss_mb():
+    """Current resident set size (Linux /proc), None elsewhere."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+def _max_rss_mb():
+    """Peak resident set size of the process so far (never decreases), None where unavailable."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # Linux reports KiB
+
+def run_backtest(rows: List[Dict[str, Any]], sims: int = 10000, seed: int = 12345, cache=None,
+                 trace_memory: bool = False, progress=None) -> Dict[str, Any]:
+    """Replay `rows` (one full season of results) and return per-step records, metrics and a stage profile.
+
+    cache: a ProbabilityCache to read/fill (opt-in, so a replay doesn't fill the shared LRU cache). With a
+    cache the steps are plain runs, which a rerun can take from the cache; without one they reuse sims
+    through an incremental store in a temp dir (different, equally valid, numbers)."""
+    from .ilp_check import guaranteed_top4, guaranteed_safe
+    from .cache import cached_probabilities
+    if trace_memory:
+        import tracemalloc
+        tracemalloc.start()
+    teams = sorted({r["home"] for r in rows} | {r["away"] for r in rows})
+    final = League.init_from_list(teams)
+    added, rejected = final.bulk_submit(rows)
+    if rejected:
+        raise ValueError(f"{len(rejected)} invalid rows, first: row {rejected[0][0]}: {rejected[0][1]}")
+    y_top4, y_safe = final_outcome(final)
+
+    L = League.init_from_list(teams)
+    flags_top4 = {t: False for t in teams}
+    flags_safe = {t: False for t in teams}
+    records = []
+    with tempfile.TemporaryDirectory() as tmp:
+        store = None if cache is not None else os.path.join(tmp, "backtest.sims.npy")
+        for step, batch in enumerate([[]] + season_steps(rows)):
+            L.bulk_submit(batch)
+            if trace_memory:
+                tracemalloc.reset_peak()
+            t0 = time.perf_counter()
+            checks = 0
+            for t in teams:  # a guarantee can't be lost by adding results: only check teams without one
+                if not flags_top4[t]:
+                    flags_top4[t] = guaranteed_top4(L, t)
+                    checks += 1
+                if not flags_safe[t]:
+                    flags_safe[t] = guaranteed_safe(L, t)
+                    checks += 1
+            t1 = time.perf_counter()
+            p4, ps, _, _, kept, hit = cached_probabilities(L, sims=sims, seed=seed, cache=cache, store_path=store)
+            t2 = time.perf_counter()
+            dates = [r["utcDate"] for r in batch if r.get("utcDate")]
+            records.append({
+                "step": step, "results": len(L.results), "date": max(dates) if dates else None,
+                "ilp_s": t1 - t0, "ilp_checks": checks, "sim_s": t2 - t1, "cache": "hit" if hit else "miss",
+                "reused_sims": kept[1].get("reused", 0) if kept else 0,
+                "rss_mb": _rss_mb(), "max_rss_mb": _max_rss_mb(),
+                "peak_mb": tracemalloc.get_traced_memory()[1] / 2 ** 20 if trace_memory else None,
+                "probTop4": {t: float(p4[t]) for t in teams}, "probSafe": {t: float(ps[t]) for t in teams},
+                "top4": [t for t in teams if flags_top4[t]], "safe": [t for t in teams if flags_safe[t]],
+            })
+            if progress:
+                progress(records[-1])
+    if trace_memory:
+        tracemalloc.stop()
+
+    eps = 0.5 / sims
+    def metrics(recs):
+        scored = [r for r in recs if r["results"] < len(final.results)]  # the last step has nothing left to predict
+        p4 = [r["probTop4"][t] for r in scored for t in teams]
+        ps = [r["probSafe"][t] for r in scored for t in teams]
+        a4 = [y_top4[t] for r in scored for t in teams]
+        as_ = [y_safe[t] for r in scored for t in teams]
+        if not p4:
+            return None
+        return {"steps": len(scored), "brier_top4": brier(p4, a4), "brier_safe": brier(ps, as_),
+                "logloss_top4": log_loss(p4, a4, eps), "logloss_safe": log_loss(ps, as_, eps)}
+
+    def profile(name, label, recs):
+        return {"stage": name, "results": label, "steps": len(recs),
+                "ilp_s": sum(r["ilp_s"] for r in recs), "ilp_checks": sum(r["ilp_checks"] for r in recs),
+                "sim_s": sum(r["sim_s"] for r in recs), "reused_sims": sum(r["reused_sims"] for r in recs),
+                "cache_hits": sum(r["cache"] == "hit" for r in recs),
+                "rss_mb": max((r["rss_mb"] for r in recs if r["rss_mb"] is not None), default=None),
+                "max_rss_mb": max((r["max_rss_mb"] for r in recs if r["max_rss_mb"] is not None), default=None),
+                "peak_mb": max(r["peak_mb"] for r in recs) if trace_memory else None, "metrics": metrics(recs)}
+
+    stages = []
+    for name, lo, hi in STAGES:
+        recs = [r for r in records if lo <= r["results"] < hi]
+        if recs:
+            stages.append(profile(name, f"{lo}-{min(hi - 1, len(final.results))}", recs))
+    scored = [r for r in records if r["results"] < len(final.results)]
+    # an official flag that did not come true would be a bug in the guarantee checks
+    violations = sorted({(t, "top4") for r in records for t in r["top4"] if not y_top4[t]}
+                        | {(t, "safe") for r in records for t in r["safe"] if not y_safe[t]})
+    return {
+        "teams": teams, "sims": sims, "seed": seed, "results": len(final.results),
+        "final": {"top4": [t for t in teams if y_top4[t]], "relegated": [t for t in teams if not y_safe[t]]},
+        "metrics": metrics(records),
+        "total": profile("all", f"0-{len(final.results)}", records),
+        "reliability": {"top4": reliability([r["probTop4"][t] for r in scored for t in teams],
+                                            [y_top4[t] for r in scored for t in teams]),
+                        "safe": reliability([r["probSafe"][t] for r in scored for t in teams],
+                                            [y_safe[t] for r in scored for t in teams])},
+        "flag_violations": [list(v) for v in violations],
+        "stages": stages,
+        "steps": records,
+    }
@@ -0,0 +1,165 @@
+from __future__ import annotations
+from typing import Any, Dict, Optional
+import hashlib, json, os, tempfile, time
+from .league import League
+
+# Cache xác suất trên đĩa, dùng chung cho status / snapshot / publish / bot.
+# Mỗi entry là một file JSON nhỏ (<key>.json) ghi bằng tmp + os.replace, nên nhiều process đọc/ghi cùng lúc
+# không bao giờ thấy file dở dang; mtime là "lần dùng cuối" để evict theo LRU khi vượt giới hạn dung lượng.
+
+CACHE_VERSION = 2  # bump when the simulation model or the cached fields change
+DEFAULT_MAX_BYTES = 32 * 1024 * 1024
+
+class ProbabilityCache:
+    def __init__(self, root: Optional[str] = None, max_bytes: Optional[int] = None):
+        self.root = root or os.environ.get("EPL_CACHE_DIR") or os.path.join(os.path.expanduser("~"), ".cache", "eplbot")
+        if max_bytes is None:
+            mb = os.environ.get("EPL_CACHE_MAX_MB")
+            max_bytes = int(float(mb) * 1024 * 1024) if mb else DEFAULT_MAX_BYTES
+        self.max_bytes = max_bytes
+        os.makedirs(self.root, exist_ok=True)
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(league: League, model: str, sims: int, seed: int) -> str:
+        """(results fingerprint, model, sims, seed); the team list is included because an empty season has
+        the same results fingerprint whatever the teams are, and the schedule because it shapes the rounds."""
+        raw = json.dumps([CACHE_VERSION, list(league.teams), league.fingerprint(), league.schedule_fingerprint(),
+                          model, sims, seed])
+        return hashlib.sha256(raw.encode()).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, key + ".json")
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                value = json.load(f)
+            os.utime(path)  # LRU: touch on hit
+        except (OSError, ValueError):  # missing, evicted meanwhile by another process, or unreadable
+            self.misses += 1
+            return None
+        self.hits += 1
+        return value
+
+    def put(self, key: str, value: Dict[str, Any]) -> None:
+        path = self._path(key)
+        fd, tmp = tempfile.mkstemp(dir=self.root, suffix=".tmp")  # unique per call: safe across threads too
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(value, f, separators=(",", ":"))
+            os.replace(tmp, path)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        self.evict()
+
+    def entries(self):
+        out = []
+        for name in os.listdir(self.root):
+            if name.endswith(".json"):
+                try:
+                    st = os.stat(os.path.join(self.root, name))
+                except OSError:
+                    continue
+                out.append((st.st_mtime, st.st_size, name))
+        return out
+
+    def evict(self) -> int:
+        """Drop least recently used entries until the cache fits in max_bytes. Returns the number removed."""
+        lock = _Lock(os.path.join(self.root, ".lock"))
+        with lock:
+            items = sorted(self.entries())
+            total = sum(s for _, s, _ in items)
+            removed = 0
+            for _, size, name in items:
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(os.path.join(self.root, name))
+                except OSError:
+                    pass
+                total -= size
+                removed += 1
+        return removed
+
+    def clear(self) -> int:
+        n = 0
+        for _, _, name in self.entries():
+            try:
+                os.remove(os.path.join(self.root, name))
+                n += 1
+            except OSError:
+                pass
+        return n
+
+class _Lock:
+    """flock on a lock file so concurrent evictions don't race; no-op where fcntl is unavailable."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.f = None
+
+    def __enter__(self):
+        try:
+            import fcntl
+        except ImportError:
+            return self
+        self.f = open(self.path, "a")
+        fcntl.flock(self.f, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        if self.f is not None:
+            self.f.close()  # closing releases the lock
+            self.f = None
+
+def default_cache() -> Optional[ProbabilityCache]:
+    """Shared cache unless disabled with EPL_CACHE_DISABLE=1 (EPL_CACHE is the bot's status file path)."""
+    if os.environ.get("EPL_CACHE_DISABLE", "").lower() in ("1", "on", "true", "yes"):
+        return None
+    try:
+        return ProbabilityCache()
+    except OSError:
+        return None
+
+def cached_probabilities(league: League, sims: int, seed: int, sampler: str = "iid",
+                         cache: Optional[ProbabilityCache] = None, store_path: Optional[str] = None,
+                         outcomes_path: Optional[str] = None, need_outcomes: bool = False):
+    """Probabilities and standard errors, served from `cache` when possible.
+
+    Returns (prob_top4, prob_safe, (se_top4, se_safe), rounds, kept, hit); rounds are the per-matchday
+    probabilities of estimate_probabilities (None without a schedule). need_outcomes and outcomes_path
+    need the per-sim matrix (`kept`), returned or written, so the cache is not read there, only refreshed:
+    a hit would leave the stored sims of an older state behind. store_path switches to
+    incremental_probabilities and bypasses the cache entirely, since reused sims give different numbers
+    than the fresh run every other caller looks up. kept is None on a hit.
+    """
+    key = ProbabilityCache.key(league, sampler, sims, seed) if cache is not None and not store_path else None
+    if key is not None and not need_outcomes and not outcomes_path:
+        value = cache.get(key)
+        if value is not None:
+            return (value["probTop4"], value["probSafe"], (value["seTop4"], value["seSafe"]), value.get("rounds"),
+                    None, True)
+    elif key is not None:
+        cache.misses += 1
+
+    from .sim import estimate_probabilities, incremental_probabilities, standard_errors
+    if store_path:
+        p4, ps, kept = incremental_probabilities(league, sims=sims, seed=seed, store_path=store_path, sampler=sampler)
+    else:
+        p4, ps, kept = estimate_probabilities(league, sims=sims, seed=seed, outcomes_path=outcomes_path,
+                                              return_outcomes=True, sampler=sampler)
+    se = standard_errors(*kept) if kept is not None else ({}, {})
+    rounds = kept[1].get("rounds") if kept is not None else None
+    if key is not None:
+        cache.put(key, {"probTop4": _floats(p4), "probSafe": _floats(ps), "seTop4": _floats(se[0]),
+                        "seSafe": _floats(se[1]), "rounds": rounds, "model": sampler, "sims": sims, "seed": seed,
+                        "fingerprint": league.fingerprint(), "created_at": int(time.time())})
+    return p4, ps, se, rounds, kept, False
+
+def _floats(d: Dict[str, Any]) -> Dict[str, float]:
+    return {k: float(v) for k, v in d.items()}
@@ -1,20 +1,28 @@
 from __future__ import annotations
-import argparse, sys
-from rich.table import Table
-from rich.console import Console
+import argparse, sys, json, time
 import os
 from .state import load_state, save_state
 from .league import League
-from .ilp_check import guaranteed_top4, guaranteed_safe
-from .sim import estimate_probabilities
-from .providers import FootballDataProvider, ApiFootballProvider 
-from .sync import merge_finished_matches
-from .snapshot import build_snapshot, write_snapshot_file
-from .publisher import publish_file, publish_gist, publish_s3, detect_current_season_year
+from .samplers import SAMPLERS  # numpy-free, shared with sim
 
-console = Console()
+# Heavy engines (pulp, numpy, rich, requests, boto3) are imported inside the commands that use them,
+# so e.g. `eplbot result` starts without loading any of them. See `python -m eplbot.importbench`.
 
-def _print_table(L: League, probs_top4=None, probs_safe=None, flags_top4=None, flags_safe=None):
+class _LazyConsole:
+    """rich Console created on first use."""
+    _console = None
+
+    def __getattr__(self, name):
+        if _LazyConsole._console is None:
+            from rich.console import Console
+            _LazyConsole._console = Console()
+        return getattr(_LazyConsole._console, name)
+
+console = _LazyConsole()
+
+def _print_table(L: League, probs_top4=None, probs_safe=None, flags_top4=None, flags_safe=None,
+                 se_top4=None, se_safe=None):
+    from rich.table import Table
     tab = Table(title="Premier League Standings (Display order: Pts, GD, GF)", show_lines=False)
     tab.add_column("#", justify="right")
     tab.add_column("Team", justify="left")
@@ -37,6 +45,9 @@ def _print_table(L: League, probs_top4=None, probs_safe=None, flags_top4=None, f
         off_str = " ".join(off) if off else "-"
         p4 = f"{100*probs_top4.get(s.team,0):.1f}%" if probs_top4 else "-"
         ps = f"{100*probs_safe.get(s.team,0):.1f}%" if probs_safe else "-"
+        if se_top4:
+            p4 += f" ±{100*se_top4[s.team]:.2f}"
+            ps += f" ±{100*se_safe[s.team]:.2f}"
         tab.add_row(str(i), s.team, str(s.played), str(s.wins), str(s.draws), str(s.losses),
                     str(s.gf), str(s.ga), str(s.gd), str(s.points),
                     off_str, p4, ps)
@@ -59,17 +70,132 @@ def cmd_result(args):
     save_state(L.to_state(), path=args.state)
     console.print(f"[cyan]Recorded:[/cyan] {args.home} {args.hg}-{args.ag} {args.away}")
 
+def cmd_import(args):
+    from .importer import import_files, load_aliases
+    L = League.from_state(load_state(args.state))
+    if not L.teams:
+        raise SystemExit("State has no teams; run init first.")
+    try:
+        added, rejected, total = import_files(L, args.files, aliases=load_aliases(args.aliases))
+    except (OSError, ValueError) as e:
+        raise SystemExit(f"Import failed: {e}")
+    if rejected:
+        from rich.table import Table
+        tab = Table(title=f"Rejected rows ({len(rejected)})")
+        tab.add_column("Row", justify="left")
+        tab.add_column("Reason", justify="left")
+        for loc, reason in rejected[:args.show]:
+            tab.add_row(loc, reason)
+        console.print(tab)
+        if len(rejected) > args.show:
+            console.print(f"[yellow]… {len(rejected) - args.show} more{'' if args.rejects else ' (use --rejects to write all)'}.[/yellow]")
+        if args.rejects:
+            import csv
+            with open(args.rejects, "w", encoding="utf-8", newline="") as f:
+                w = csv.writer(f)
+                w.writerow(["row", "reason"])
+                w.writerows(rejected)
+    if args.dry_run or (args.strict and rejected):
+        console.print(f"[yellow]{total} rows read, {added} valid, {len(rejected)} rejected; state not written"
+                      f"{' (--strict)' if rejected and args.strict and not args.dry_run else ''}.[/yellow]")
+        return 1 if rejected and args.strict else 0
+    if added:
+        save_state(L.to_state(), path=args.state)  # one write for the whole import
+    console.print(f"[green]{total} rows read, {added} results added, {len(rejected)} rejected.[/green]")
+    return 0
+
+def cmd_backtest(args):
+    from .importer import read_rows
+    from .backtest import run_backtest
+    from rich.table import Table
+    try:
+        entries = [e for path in args.files for e in read_rows(path)]
+    except (OSError, ValueError) as e:
+        raise SystemExit(f"Backtest failed: {e}")
+    skipped = [(loc, row["_reason"]) for loc, row in entries if "_reason" in row]
+    rows = [row for _, row in entries if "_reason" not in row]
+    if skipped:
+        console.print(f"[yellow]Skipping {len(skipped)} unusable rows (first: {skipped[0][0]}: {skipped[0][1]}).[/yellow]")
+    if not rows:
+        raise SystemExit("No finished results to replay.")
+    if not all(r.get("utcDate") for r in rows):
+        console.print("[yellow]Some rows have no date: replaying in file order.[/yellow]")
+    cache = None
+    if args.shared_cache:
+        from .cache import default_cache
+        cache = default_cache()
+
+    def progress(r):
+        console.print(f"[dim]step {r['step']:>2} · {r['results']:>3} results · {(r['date'] or '-')[:10]:<10} · "
+                      f"ILP {r['ilp_s']:.2f}s ({r['ilp_checks']} checks) · sim {r['sim_s']:.2f}s "
+                      f"({'cache' if r['cache'] == 'hit' else str(r['reused_sims']) + ' reused'})[/dim]")
+    t0 = time.perf_counter()
+    try:
+        rep = run_backtest(rows, sims=args.sims, seed=args.seed, cache=cache, trace_memory=args.trace_memory,
+                           progress=None if args.quiet else progress)
+    except ValueError as e:
+        raise SystemExit(f"Backtest failed: {e}")
+    rep["elapsed_s"] = time.perf_counter() - t0
+
+    stages = rep["stages"] + [rep["total"]]
+    tab = Table(title=f"Backtest profile: {rep['results']} results, {len(rep['steps'])} steps, {args.sims} sims "
+                      f"({rep['elapsed_s']:.1f}s)")
+    for col in ("Stage", "Results", "Steps", "ILP s", "Checks", "Sim s", "Reused", "Cached", "RSS MB", "Max RSS MB") + (
+            ("Peak MB",) if args.trace_memory else ()):
+        tab.add_column(col, justify="left" if col == "Stage" else "right")
+    for s in stages:
+        row = [s["stage"], s["results"], str(s["steps"]), f"{s['ilp_s']:.2f}", str(s["ilp_checks"]),
+               f"{s['sim_s']:.2f}", str(s["reused_sims"]), str(s["cache_hits"]),
+               *("-" if s[k] is None else f"{s[k]:.0f}" for k in ("rss_mb", "max_rss_mb"))]
+        if args.trace_memory:
+            row.append(f"{s['peak_mb']:.1f}")
+        tab.add_row(*row)
+    console.print(tab)
+    tab = Table(title="Calibration vs final table (lower is better)")
+    for col in ("Stage", "Steps", "Brier top4", "Brier safe", "LogLoss top4", "LogLoss safe"):
+        tab.add_column(col, justify="left" if col == "Stage" else "right")
+    for s in stages:
+        m = s["metrics"] or {}
+        tab.add_row(s["stage"], str(m.get("steps", 0)), *(f"{m[k]:.4f}" if k in m else "-"
+                    for k in ("brier_top4", "brier_safe", "logloss_top4", "logloss_safe")))
+    console.print(tab)
+    for key, label in (("top4", "Top-4"), ("safe", "Safety")):
+        cal = Table(title=f"{label} calibration (all teams × steps)")
+        for col in ("Forecast", "N", "Mean p", "Observed"):
+            cal.add_column(col, justify="right")
+        for b in rep["reliability"][key]:
+            cal.add_row(b["bin"], str(b["n"]), f"{b['mean_p']:.3f}", f"{b['observed']:.3f}")
+        console.print(cal)
+    if rep["flag_violations"]:
+        console.print(f"[red]Official flags that did not hold: {rep['flag_violations']}[/red]")
+    console.print(f"Final top 4: {', '.join(rep['final']['top4'])} · relegated: {', '.join(rep['final']['relegated'])}")
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(rep, f, ensure_ascii=False, indent=1)
+        console.print(f"[green]Report written to {args.out}[/green]")
+    return 1 if rep["flag_violations"] else 0
+
 def cmd_status(args):
+    from .ilp_check import guaranteed_top4, guaranteed_safe
     st = load_state(args.state)
     L = League.from_state(st)
     flags_top4 = {t: guaranteed_top4(L, t) for t in L.teams}
     flags_safe = {t: guaranteed_safe(L, t) for t in L.teams}
-    probs_top4 = probs_safe = None
+    probs_top4 = probs_safe = se_top4 = se_safe = None
     if not args.no_sim:
-        probs_top4, probs_safe = estimate_probabilities(L, sims=args.sims, seed=args.seed)
-    _print_table(L, probs_top4, probs_safe, flags_top4, flags_safe)
+        from .cache import cached_probabilities, default_cache
+        cache = None if args.no_cache else default_cache()
+        probs_top4, probs_safe, (se_top4, se_safe), _, _, hit = cached_probabilities(
+            L, sims=args.sims, seed=args.seed, sampler=args.sampler, cache=cache)
+        if not args.show_se:
+            se_top4 = se_safe = None
+        if cache is not None:
+            console.print(f"[dim]Probability cache: {'hit' if hit else 'miss'} ({cache.root})[/dim]")
+    _print_table(L, probs_top4, probs_safe, flags_top4, flags_safe, se_top4, se_safe)
 
 def cmd_sync(args):
+    from .providers import FootballDataProvider, ApiFootballProvider
+    from .sync import merge_season
     st = load_state(args.state)
     L = League.from_state(st)
 
@@ -77,64 +203,325 @@ def cmd_sync(args):
     if args.provider == "football-data":
         provider = FootballDataProvider()
         if args.season is None:
+            from .publisher import detect_current_season_year
             season = detect_current_season_year()
         else:
             season = args.season
-        matches = provider.finished_matches(season=season)
-        console.print(f"[yellow]Fetched {len(matches)} finished matches from football-data (season={season}).[/yellow]")
-        added += merge_finished_matches(L, matches)
+        matches = provider.season_matches(season=season)
+        console.print(f"[yellow]Fetched {len(matches)} matches from football-data (season={season}).[/yellow]")
+        added, scheduled = merge_season(L, matches)
     elif args.provider == "api-football":
         provider = ApiFootballProvider()
         if args.season is None:
             raise SystemExit("Please provide --season for api-football.")
-        matches = provider.finished_matches(season=args.season)
-        console.print(f"[yellow]Fetched {len(matches)} finished matches from api-football (season={args.season}).[/yellow]")
-        added += merge_finished_matches(L, matches)
+        matches = provider.season_matches(season=args.season)
+        console.print(f"[yellow]Fetched {len(matches)} matches from api-football (season={args.season}).[/yellow]")
+        added, scheduled = merge_season(L, matches)
     else:
         raise SystemExit("Unknown provider")
 
     save_state(L.to_state(), path=args.state)
-    console.print(f"[green]Synced {added} matches from {args.provider}.[/green]")
+    console.print(f"[green]Synced {added} matches from {args.provider} ({scheduled} fixtures scheduled).[/green]")
+
+def _cache(args):
+    from .cache import default_cache
+    return None if args.no_cache else default_cache()
 
 def cmd_snapshot(args):
+    from .snapshot import build_snapshot, write_snapshot_file, outcomes_path_for
+    _check_workers(args)
     st = load_state(args.state)
     L = League.from_state(st)
-    snap = build_snapshot(L, sims=args.sims, seed=args.seed)
-    write_snapshot_file(snap, args.out)
-    console.print(f"[green]Snapshot written to {args.out} (sims={args.sims}, seed={args.seed}, results={len(L.results)}).[/green]")
+    outcomes_path = outcomes_path_for(args.out) if (args.keep_sims or args.incremental) else None
+    snap = build_snapshot(L, sims=args.sims, seed=args.seed, outcomes_path=outcomes_path,
+                          leverage_top=args.leverage, incremental=args.incremental,
+                          sampler=args.sampler, history_path=args.history, cache=_cache(args),
+                          workers=args.workers)
+    digest = write_snapshot_file(snap, args.out, compact=args.compact, precompress=args.precompress)
+    console.print(f"[green]Snapshot written to {args.out} (sims={args.sims}, seed={args.seed}, results={len(L.results)}, sha256={digest[:12]}, cache={snap['meta'].get('cache', 'off')}).[/green]")
+    tm = snap["meta"]["timings"]
+    console.print(f"[dim]{tm['total']:.2f}s with {snap['meta']['workers']} workers: official {tm['official']:.2f}s "
+                  f"(solver {tm['official_solver']:.2f}s), probabilities {tm['probabilities']:.2f}s, "
+                  f"leverage {tm['leverage']:.2f}s[/dim]")
+
+def _check_workers(args):
+    """--workers / EPL_WORKERS must be >= 1; resolved here so a bad value fails before any work."""
+    if args.workers is not None:
+        if args.workers < 1:
+            raise SystemExit("--workers must be at least 1")
+        return
+    from .snapshot import default_workers
+    try:
+        args.workers = default_workers()
+    except ValueError as e:
+        raise SystemExit(str(e))
+
+def _check_publish_args(args):
+    _check_workers(args)
+    if "file" in args.mode and not args.dest:
+        raise SystemExit("--dest path required for mode=file")
+    if "gist" in args.mode and not (args.gist_id or os.environ.get("GIST_ID")):
+        raise SystemExit("--gist-id or env GIST_ID required for mode=gist")
+    if "s3" in args.mode and (not args.s3_bucket or not args.s3_key):
+        raise SystemExit("--s3-bucket and --s3-key required for mode=s3")
+    if args.retries < 1:
+        raise SystemExit("--retries must be at least 1")
+
+def _reusable_snapshot(args, meta):
+    """Snapshot local từ lần publish trước bị lỗi giữa chừng: dùng lại để file giữ nguyên byte,
+    nhờ vậy các target đã upload thành công sẽ được bỏ qua theo content hash."""
+    from .snapshot import compressed_siblings, expand_snapshot
+    try:
+        with open(args.out, "r", encoding="utf-8") as f:
+            obj = json.load(f)
+    except Exception:
+        return None
+    old = obj.get("meta", {})
+    if any(old.get(k) != v for k, v in meta.items()):
+        return None
+    if (old.get("format") == "compact") != bool(args.compact):
+        return None
+    if args.precompress and "gzip" not in compressed_siblings(args.out):
+        return None
+    return expand_snapshot(obj)
 
 def cmd_publish(args):
+    from .publisher import (detect_current_season_year, load_manifest, save_manifest, snapshot_changed,
+                            file_target, gist_target, s3_target, publish_to_targets)
+    _check_publish_args(args)
     st = load_state(args.state)
     L = League.from_state(st)
     if args.with_sync:
+        from .providers import FootballDataProvider
+        from .sync import merge_season
         season = args.season or detect_current_season_year()
         provider = FootballDataProvider()
-        matches = provider.finished_matches(season=season)
-        added = merge_finished_matches(L, matches)
+        added, _ = merge_season(L, provider.season_matches(season=season))
         save_state(L.to_state(), path=args.state)
         console.print(f"[yellow]Pre-sync from football-data: season={season}, added={added}[/yellow]")
 
-    snap = build_snapshot(L, sims=args.sims, seed=args.seed)
-    write_snapshot_file(snap, args.out)
-    console.print(f"[green]Snapshot created: {args.out}[/green]")
-
-    if args.mode == "file":
-        if not args.dest:
-            raise SystemExit("--dest path required for mode=file")
-        url = publish_file(args.out, args.dest)
-    elif args.mode == "gist":
-        gist_id = args.gist_id or os.environ.get("GIST_ID")
-        if not gist_id:
-            raise SystemExit("--gist-id or env GIST_ID required for mode=gist")
-        url = publish_gist(args.out, gist_id=gist_id)
-    elif args.mode == "s3":
-        if not args.s3_bucket or not args.s3_key:
-            raise SystemExit("--s3-bucket and --s3-key required for mode=s3")
-        url = publish_s3(args.out, bucket=args.s3_bucket, key=args.s3_key, region=args.s3_region, public=not args.s3_private)
+    manifest = load_manifest(args.manifest)
+    meta = {"fingerprint": L.fingerprint(), "schedule_fingerprint": L.schedule_fingerprint(), "sims": args.sims,
+            "seed": args.seed, "sampler": args.sampler}
+    if not args.force and not snapshot_changed(meta, manifest, targets=list(args.mode)):
+        console.print(f"[cyan]Unchanged since last publish ({', '.join(manifest.get('urls', {}).values())}); skipping upload.[/cyan]")
+        return 0
+
+    from .snapshot import (build_snapshot, write_snapshot_file, build_delta, write_delta_file, compressed_siblings,
+                           outcomes_path_for)
+
+    snap = None if args.force else _reusable_snapshot(args, meta)
+    if snap is not None:
+        console.print(f"[green]Reusing {args.out} (same fingerprint/sims/seed, not yet fully published).[/green]")
+    else:
+        outcomes_path = outcomes_path_for(args.out) if (args.keep_sims or args.incremental) else None
+        snap = build_snapshot(L, sims=args.sims, seed=args.seed, outcomes_path=outcomes_path,
+                              leverage_top=args.leverage, incremental=args.incremental,
+                              sampler=args.sampler, history_path=args.history, cache=_cache(args),
+                              workers=args.workers)
+        digest = write_snapshot_file(snap, args.out, compact=args.compact, precompress=args.precompress)
+        console.print(f"[green]Snapshot created: {args.out} (sha256={digest[:12]}, cache={snap['meta'].get('cache', 'off')})[/green]")
+
+    extras = []  # small side files published next to the main snapshot
+    if args.delta and manifest:
+        write_delta_file(build_delta(manifest["snapshot"], snap), args.delta)
+        extras.append(args.delta)
+        console.print(f"[green]Delta created: {args.delta}[/green]")
+    if args.history:
+        from .history import export_history_json
+        history_json = os.path.join(os.path.dirname(args.out), "history.json")
+        n = export_history_json(args.history, history_json)
+        extras.append(history_json)
+        console.print(f"[green]History exported: {history_json} ({n} rows)[/green]")
+
+    siblings = compressed_siblings(args.out)
+    targets = {}
+    for mode in dict.fromkeys(args.mode):
+        if mode == "file":
+            objects = [(args.out, args.dest, None)]
+            objects += [(v, args.dest + v[len(args.out):], enc) for enc, v in siblings.items()]
+            objects += [(x, os.path.join(os.path.dirname(args.dest), os.path.basename(x)), None) for x in extras]
+            targets["file"] = file_target(objects)
+        elif mode == "gist":
+            gist_id = args.gist_id or os.environ.get("GIST_ID")
+            targets["gist"] = gist_target([args.out] + extras, gist_id=gist_id)
+        elif mode == "s3":
+            prefix = args.s3_key.rsplit("/", 1)[0] + "/" if "/" in args.s3_key else ""
+            objects = [(args.out, args.s3_key, None)]
+            objects += [(v, args.s3_key + v[len(args.out):], enc) for enc, v in siblings.items()]
+            objects += [(x, prefix + os.path.basename(x), None) for x in extras]
+            targets["s3"] = s3_target(objects, bucket=args.s3_bucket, region=args.s3_region, public=not args.s3_private)
+
+    report = publish_to_targets(targets, retries=args.retries)
+    for r in report:
+        if r["status"] == "failed":
+            console.print(f"[red]{r['target']}: failed after {r['attempts']} attempt(s): {r['error']}[/red]")
+        else:
+            console.print(f"[cyan]{r['target']}: {r['status']} → {r['url']}[/cyan]")
+
+    if any(r["status"] == "failed" for r in report):
+        return 1
+    save_manifest(args.manifest, snap, {r["target"]: r["url"] for r in report})
+    return 0
+
+def cmd_whatif(args):
+    from rich.table import Table
+    from .sim import load_outcomes, parse_pin, conditional_probabilities
+    try:
+        data, meta = load_outcomes(args.sims_file)
+        pins = [parse_pin(p) for p in args.pin]
+        base_top4, base_safe, _ = conditional_probabilities(data, meta, [])
+        p4, ps, n = conditional_probabilities(data, meta, pins)
+    except (OSError, ValueError) as e:
+        raise SystemExit(f"What-if failed: {e}")
+    L = League.from_state(load_state(args.state))
+    if meta["fingerprint"] != L.fingerprint():
+        console.print("[yellow]Warning: state has changed since these sims were stored; rerun snapshot --keep-sims.[/yellow]")
+
+    tab = Table(title="What-if: " + ", ".join(args.pin))
+    for col in ("Team", "%Top4", "Δ", "%Safe", "Δ"):
+        tab.add_column(col, justify="left" if col == "Team" else "right")
+    for t in sorted(meta["teams"], key=lambda t: (-p4[t], -ps[t])):
+        tab.add_row(t, f"{100*p4[t]:.1f}%", f"{100*(p4[t]-base_top4[t]):+.1f}",
+                    f"{100*ps[t]:.1f}%", f"{100*(ps[t]-base_safe[t]):+.1f}")
+    console.print(tab)
+    console.print(f"[cyan]{n} of {meta['sims']} stored sims match (seed={meta['seed']}).[/cyan]")
+
+def _swing(v):
+    v = [x for x in v if x is not None]
+    return max(v) - min(v) if v else 0.0
+
+def _fmt_swing(v):
+    return "/".join("-" if x is None else f"{100*x:.0f}" for x in v)
+
+def cmd_leverage(args):
+    from rich.table import Table
+    from .sim import estimate_probabilities, load_outcomes, fixture_leverage, summarize_leverage
+    L = League.from_state(load_state(args.state))
+    if args.sims_file:
+        try:
+            data, meta = load_outcomes(args.sims_file)
+        except (OSError, ValueError) as e:
+            raise SystemExit(f"Leverage failed: {e}")
+        if meta["fingerprint"] != L.fingerprint():
+            console.print("[yellow]Warning: state has changed since these sims were stored.[/yellow]")
     else:
-        raise SystemExit("Unknown publish mode")
+        _, _, kept = estimate_probabilities(L, sims=args.sims, seed=args.seed, return_outcomes=True)
+        if kept is None:
+            console.print("[yellow]No remaining fixtures.[/yellow]")
+            return 0
+        data, meta = kept
+    lev = summarize_leverage(fixture_leverage(data, meta), top=args.top, min_swing=args.min_swing)
+
+    tab = Table(title="Fixture leverage (team odds if H / D / A, %)")
+    tab.add_column("#", justify="right")
+    tab.add_column("Fixture", justify="left")
+    tab.add_column("Leverage", justify="right")
+    tab.add_column("Biggest swings", justify="left")
+    for i, f in enumerate(lev, start=1):
+        movers = []
+        for t in f["teams"][:4]:
+            kind, vals = max((("Top4", t["top4"]), ("Safe", t["safe"])), key=lambda kv: _swing(kv[1]))
+            movers.append(f"{t['team']} {kind} {_fmt_swing(vals)}")
+        tab.add_row(str(i), f"{f['home']} vs {f['away']}", f"{f['leverage']:.2f}", "\n".join(movers) or "-")
+    console.print(tab)
+
+def cmd_history(args):
+    from rich.table import Table
+    from .history import read_history, team_trend, export_history_json
+    try:
+        if args.export:
+            n = export_history_json(args.file, args.export)
+            console.print(f"[green]Exported {n} rows to {args.export}[/green]")
+        trend = team_trend(args.file, args.team) if args.team else None
+        rows, teams = read_history(args.file) if not (args.team or args.export) else (None, None)
+    except (OSError, ValueError) as e:
+        raise SystemExit(f"History failed: {e}")
+    if args.team:
+        tab = Table(title=f"History: {args.team}")
+        for col in ("Date", "Results", "Pts", "%Top4", "%Safe", "Official"):
+            tab.add_column(col, justify="left" if col in ("Date", "Official") else "right")
+        for r in trend:
+            off = " ".join(x for x, ok in (("CL✅", r["top4"]), ("Safe✅", r["safe"])) if ok) or "-"
+            tab.add_row(time.strftime("%Y-%m-%d %H:%M", time.localtime(r["generated_at"])), str(r["results_count"]),
+                        str(r["points"]), f"{100*r['probTop4']:.1f}%", f"{100*r['probSafe']:.1f}%", off)
+        console.print(tab)
+    elif not args.export:
+        console.print(f"{args.file}: {len(rows)} snapshots, {len(teams)} teams"
+                      + (f", results {int(rows['results_count'][0])}→{int(rows['results_count'][-1])}" if len(rows) else ""))
+
+def cmd_daemon(args):
+    from .daemon import Daemon
+    _check_publish_args(args)
+    args.with_sync = False  # the daemon syncs itself, keeping one provider session
+    args.force = False
+    d = Daemon(args.state, publish=lambda: cmd_publish(args), season=args.season, status_path=args.status_file,
+               live_interval=args.live_interval, idle_interval=args.idle_interval, max_backoff=args.max_backoff,
+               log=lambda msg: console.print(f"[{time.strftime('%H:%M:%S')}] {msg}"))
+    console.print(f"[green]Daemon started (status file: {args.status_file}).[/green]")
+    return d.run(max_cycles=args.max_cycles)
+
+def cmd_cache(args):
+    from .cache import ProbabilityCache
+    cache = ProbabilityCache()
+    if args.clear:
+        console.print(f"[green]Removed {cache.clear()} cached result(s) from {cache.root}.[/green]")
+        return 0
+    items = cache.entries()
+    console.print(f"{cache.root}: {len(items)} entries, {sum(s for _, s, _ in items) / 1024:.1f} KiB "
+                  f"(limit {cache.max_bytes / 1024 / 1024:.0f} MiB)")
 
-    console.print(f"[cyan]Published to: {url}[/cyan]")
+def _default_index():
+    for path in ("index.html", os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "index.html")):
+        if os.path.exists(path):
+            return path
+    return None
+
+def cmd_serve(args):
+    import asyncio
+    from .server import serve
+    index = args.index or _default_index()
+    hist = args.history_json or os.path.join(os.path.dirname(args.snapshot) or ".", "history.json")
+
+    def ready(app, sockets):
+        host, port = sockets[0].getsockname()[:2]
+        if app.fingerprint is None:
+            console.print(f"[yellow]{args.snapshot} not found yet; it will be served once written.[/yellow]")
+        console.print(f"[green]Serving on http://{host}:{port}/[/green] (snapshot={args.snapshot}, "
+                      f"index={index or '-'}, events=/events)")
+    try:
+        asyncio.run(serve(args.snapshot, index, hist, host=args.host, port=args.port, poll=args.poll, ready=ready))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+def _add_publish_args(p):
+    """Snapshot and target options shared by publish and daemon."""
+    p.add_argument("--sims", type=int, default=20000)
+    p.add_argument("--seed", type=int, default=12345)
+    p.add_argument("--out", default="snapshot.json", help="Local snapshot path to create before publishing")
+    p.add_argument("--leverage", type=int, default=0, metavar="N", help="Add a leverage section with the N biggest fixtures")
+    p.add_argument("--history", help="Append per-team probabilities to this history file (e.g. history.bin)")
+    p.add_argument("--sampler", choices=SAMPLERS, default="iid", help="Outcome sampling scheme (variance reduction)")
+    p.add_argument("--incremental", action="store_true",
+                    help="Reuse the stored outcome matrix from the previous run when only new results were added (implies --keep-sims)")
+    p.add_argument("--keep-sims", action="store_true", help="Keep the per-sim outcome matrix next to the snapshot (for whatif)")
+    p.add_argument("--compact", action="store_true", help="Minified JSON with index-encoded fixtures and meta.content_hash")
+    p.add_argument("--precompress", action="store_true", help="Also write and publish .gz/.br siblings (file and s3 modes)")
+    p.add_argument("--season", type=int, help="Season start year; if omitted, auto-detect via football-data")
+    p.add_argument("--mode", choices=["file","gist","s3"], nargs="+", required=True,
+                   help="One or more targets; the snapshot is built once and uploaded to all of them concurrently")
+    p.add_argument("--retries", type=int, default=3, help="Upload attempts per target")
+    p.add_argument("--dest", help="Destination file path for mode=file")
+    p.add_argument("--gist-id", help="Gist ID for mode=gist (or set env GIST_ID)")
+    p.add_argument("--s3-bucket")
+    p.add_argument("--s3-key")
+    p.add_argument("--s3-region")
+    p.add_argument("--s3-private", action="store_true", help="Do not set public-read on S3 object")
+    p.add_argument("--manifest", default="publish_manifest.json", help="Manifest of the last publish, used to skip unchanged uploads")
+    p.add_argument("--delta", help="Also write and publish a compact delta (changed rows only) to this path")
+    p.add_argument("--no-cache", action="store_true", help="Do not use the probability cache")
+    p.add_argument("--workers", type=int, help="Threads shared by the official checks and the simulation (default EPL_WORKERS or CPU count)")
 
 def main(argv=None):
     p = argparse.ArgumentParser(prog="eplbot", description="EPL Top-4 & Relegation Safety Bot")
@@ -153,10 +540,33 @@ def main(argv=None):
     p_res.add_argument("--ag", type=int, required=True)
     p_res.set_defaults(func=cmd_result)
 
+    p_imp = sub.add_parser("import", help="Bulk-import results from CSV / JSON / JSON-lines files (incl. provider dumps)")
+    p_imp.add_argument("files", nargs="+", help=".csv (home,away,hg,ag or HomeTeam,AwayTeam,FTHG,FTAG), .json or .jsonl")
+    p_imp.add_argument("--aliases", help='JSON file {"alias": "team name in state"}')
+    p_imp.add_argument("--strict", action="store_true", help="Write nothing if any row is rejected")
+    p_imp.add_argument("--dry-run", action="store_true", help="Validate only")
+    p_imp.add_argument("--rejects", help="Write every rejected row with its reason to this CSV")
+    p_imp.add_argument("--show", type=int, default=20, help="Rejected rows to print")
+    p_imp.set_defaults(func=cmd_import)
+
+    p_bt = sub.add_parser("backtest", help="Replay a finished season matchweek by matchweek: calibration and runtime profile")
+    p_bt.add_argument("files", nargs="+", help="Results of one whole season (.csv/.json/.jsonl, provider dumps too)")
+    p_bt.add_argument("--sims", type=int, default=10000)
+    p_bt.add_argument("--seed", type=int, default=12345)
+    p_bt.add_argument("--out", help="Write the full report (per-step predictions, metrics, profile) as JSON")
+    p_bt.add_argument("--shared-cache", action="store_true",
+                      help="Read/fill the shared probability cache (reruns become cache hits; default: no cache)")
+    p_bt.add_argument("--trace-memory", action="store_true", help="Track Python peak memory per step (slower)")
+    p_bt.add_argument("--quiet", action="store_true", help="No per-step progress lines")
+    p_bt.set_defaults(func=cmd_backtest)
+
     p_stat = sub.add_parser("status", help="Show table, official flags, and probabilities")
     p_stat.add_argument("--no-sim", action="store_true", help="Skip Monte Carlo")
     p_stat.add_argument("--sims", type=int, default=20000, help="Number of simulations")
     p_stat.add_argument("--seed", type=int, default=12345, help="RNG seed for reproducibility")
+    p_stat.add_argument("--sampler", choices=SAMPLERS, default="iid", help="Outcome sampling scheme (variance reduction)")
+    p_stat.add_argument("--show-se", action="store_true", help="Show per-team standard errors")
+    p_stat.add_argument("--no-cache", action="store_true", help="Do not use the probability cache")
     p_stat.set_defaults(func=cmd_status)
 
     p_sync = sub.add_parser("sync", help="Sync finished matches from a provider")
@@ -168,23 +578,65 @@ def main(argv=None):
     p_snap.add_argument("--sims", type=int, default=20000)
     p_snap.add_argument("--seed", type=int, default=12345)
     p_snap.add_argument("--out", default="snapshot.json")
+    p_snap.add_argument("--leverage", type=int, default=0, metavar="N", help="Add a leverage section with the N biggest fixtures")
+    p_snap.add_argument("--history", help="Append per-team probabilities to this history file (e.g. history.bin)")
+    p_snap.add_argument("--sampler", choices=SAMPLERS, default="iid", help="Outcome sampling scheme (variance reduction)")
+    p_snap.add_argument("--incremental", action="store_true",
+                        help="Reuse the stored outcome matrix from the previous run when only new results were added (implies --keep-sims)")
+    p_snap.add_argument("--keep-sims", action="store_true", help="Keep the per-sim outcome matrix next to the snapshot (for whatif)")
+    p_snap.add_argument("--compact", action="store_true", help="Minified JSON with index-encoded fixtures and meta.content_hash")
+    p_snap.add_argument("--precompress", action="store_true", help="Also write .gz (and .br if brotli is installed) siblings")
+    p_snap.add_argument("--no-cache", action="store_true", help="Do not use the probability cache")
+    p_snap.add_argument("--workers", type=int, help="Threads shared by the official checks and the simulation (default EPL_WORKERS or CPU count)")
     p_snap.set_defaults(func=cmd_snapshot)
 
     p_pub = sub.add_parser("publish", help="Run sims once, create snapshot.json, and publish it")
-    p_pub.add_argument("--sims", type=int, default=20000)
-    p_pub.add_argument("--seed", type=int, default=12345)
-    p_pub.add_argument("--out", default="snapshot.json", help="Local snapshot path to create before publishing")
+    _add_publish_args(p_pub)
     p_pub.add_argument("--with-sync", action="store_true", help="Pre-sync finished matches from football-data before snapshot")
-    p_pub.add_argument("--season", type=int, help="Season start year; if omitted, auto-detect via football-data")
-    p_pub.add_argument("--mode", choices=["file","gist","s3"], required=True)
-    p_pub.add_argument("--dest", help="Destination file path for mode=file")
-    p_pub.add_argument("--gist-id", help="Gist ID for mode=gist (or set env GIST_ID)")
-    p_pub.add_argument("--s3-bucket")
-    p_pub.add_argument("--s3-key")
-    p_pub.add_argument("--s3-region")
-    p_pub.add_argument("--s3-private", action="store_true", help="Do not set public-read on S3 object")
+    p_pub.add_argument("--force", action="store_true", help="Publish even if fingerprint/sims/seed are unchanged")
     p_pub.set_defaults(func=cmd_publish)
 
+    p_dmn = sub.add_parser("daemon", help="Stay resident: sync from football-data, recompute and publish only on new results")
+    _add_publish_args(p_dmn)
+    p_dmn.add_argument("--live-interval", type=float, default=120, help="Seconds between polls around kickoffs")
+    p_dmn.add_argument("--idle-interval", type=float, default=1800, help="Seconds between polls outside matchdays")
+    p_dmn.add_argument("--max-backoff", type=float, default=900, help="Upper bound for the retry delay after errors")
+    p_dmn.add_argument("--status-file", default="daemon_status.json", help="Health/status JSON rewritten every poll")
+    p_dmn.add_argument("--max-cycles", type=int, help=argparse.SUPPRESS)
+    p_dmn.set_defaults(func=cmd_daemon)
+
+    p_wi = sub.add_parser("whatif", help="Conditional probabilities for pinned fixture outcomes, from stored sims")
+    p_wi.add_argument("--pin", action="append", required=True, help='"Home;Away;H|D|A" (repeatable)')
+    p_wi.add_argument("--sims-file", default="snapshot.sims.npy", help="Outcome matrix written by snapshot/publish --keep-sims")
+    p_wi.set_defaults(func=cmd_whatif)
+
+    p_lev = sub.add_parser("leverage", help="Rank remaining fixtures by how much they swing top-4/safety odds")
+    p_lev.add_argument("--sims", type=int, default=20000)
+    p_lev.add_argument("--seed", type=int, default=12345)
+    p_lev.add_argument("--top", type=int, default=10, help="Number of fixtures to show")
+    p_lev.add_argument("--min-swing", type=float, default=0.01, help="Hide teams whose odds move less than this")
+    p_lev.add_argument("--sims-file", help="Use a stored outcome matrix (snapshot --keep-sims) instead of simulating")
+    p_lev.set_defaults(func=cmd_leverage)
+
+    p_hist = sub.add_parser("history", help="Show or export the per-snapshot probability history")
+    p_hist.add_argument("--file", default="history.bin", help="History file written by snapshot/publish --history")
+    p_hist.add_argument("--team", help="Show this team's trend")
+    p_hist.add_argument("--export", help="Write history.json for the web view to this path")
+    p_hist.set_defaults(func=cmd_history)
+
+    p_cache = sub.add_parser("cache", help="Show or clear the probability result cache (EPL_CACHE_DIR)")
+    p_cache.add_argument("--clear", action="store_true", help="Remove all cached results")
+    p_cache.set_defaults(func=cmd_cache)
+
+    p_srv = sub.add_parser("serve", help="Serve snapshot.json, history.json and index.html over HTTP with live update events")
+    p_srv.add_argument("--snapshot", default="snapshot.json", help="Snapshot file to serve (reloaded when it changes)")
+    p_srv.add_argument("--history-json", help="history.json to serve (default: next to --snapshot)")
+    p_srv.add_argument("--index", help="index.html to serve at / (default: ./index.html, else the repo copy)")
+    p_srv.add_argument("--host", default="127.0.0.1")
+    p_srv.add_argument("--port", type=int, default=8000)
+    p_srv.add_argument("--poll", type=float, default=1.0, help="Seconds between file change checks")
+    p_srv.set_defaults(func=cmd_serve)
+
     args = p.parse_args(argv)
     if not hasattr(args, "func"):
         p.print_help()
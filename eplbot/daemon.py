@@ -0,0 +1,139 @@
+from __future__ import annotations
+from typing import Any, Callable, Dict, List, Optional
+from datetime import datetime
+import json, os, random, signal, threading, time
+from .state import load_state, save_state
+from .league import League
+from .sync import merge_season
+
+# `eplbot daemon`: thay cho cron `publish --with-sync`. Tiến trình chạy thường trú giữ session HTTP của
+# provider và các module đã import; mỗi vòng chỉ gọi 1 request lấy cả mùa (kết quả + giờ bóng lăn),
+# và chỉ tính lại/publish khi fingerprint kết quả đổi.
+
+WINDOW_BEFORE = 15 * 60   # bắt đầu poll dày trước giờ bóng lăn
+WINDOW_AFTER = 150 * 60   # ...và tới khi kết quả chắc chắn đã FINISHED
+PENDING = {"SCHEDULED", "TIMED", "IN_PLAY", "PAUSED", "LIVE", "SUSPENDED"}
+
+def _ts(iso: str) -> float:
+    return datetime.fromisoformat(iso.replace("Z", "+00:00")).timestamp()
+
+def kickoff_times(matches: List[Dict[str, Any]]) -> List[float]:
+    """Kickoff timestamps of matches that can still produce a result (postponed/cancelled ones are ignored)."""
+    return sorted(_ts(m["utcDate"]) for m in matches if m.get("status") in PENDING and m.get("utcDate"))
+
+def in_kickoff_window(now: float, kickoffs: List[float]) -> bool:
+    return any(k - WINDOW_BEFORE <= now <= k + WINDOW_AFTER for k in kickoffs)
+
+def next_poll_delay(now: float, kickoffs: List[float], live: float, idle: float) -> float:
+    """`live` seconds inside a kickoff window, otherwise `idle`, but never sleeping past the next window."""
+    if in_kickoff_window(now, kickoffs):
+        return live
+    upcoming = [k - WINDOW_BEFORE - now for k in kickoffs if k - WINDOW_BEFORE > now]
+    return max(1.0, min([idle] + upcoming))
+
+def backoff_delay(failures: int, base: float, cap: float, retry_after: Optional[float] = None) -> float:
+    """Exponential backoff with jitter (half fixed, half random) so restarted daemons don't retry in lockstep."""
+    d = min(cap, base * 2 ** max(0, failures - 1))
+    d = d / 2 + random.uniform(0, d / 2)
+    return max(d, retry_after or 0.0)
+
+def _retry_after(exc: Exception) -> Optional[float]:
+    resp = getattr(exc, "response", None)
+    if resp is not None and getattr(resp, "status_code", None) == 429:
+        try:
+            return float(resp.headers.get("Retry-After", ""))
+        except ValueError:
+            return None
+    return None
+
+class Daemon:
+    """Sync → recompute → publish loop. `publish()` does the snapshot+upload and returns 0 on success."""
+
+    def __init__(self, state_path: str, publish: Callable[[], int], season: Optional[int] = None,
+                 status_path: str = "daemon_status.json", live_interval: float = 120.0,
+                 idle_interval: float = 1800.0, backoff_base: float = 30.0, max_backoff: float = 900.0,
+                 provider=None, log: Callable[[str], Any] = print):
+        self.state_path = state_path
+        self.publish = publish
+        self.season = season
+        self.status_path = status_path
+        self.live, self.idle = live_interval, idle_interval
+        self.backoff_base, self.max_backoff = backoff_base, max_backoff
+        self.provider = provider
+        self.log = log
+        self.published_fp: Optional[tuple] = None  # (results fingerprint, schedule fingerprint) last published
+        self.kickoffs: List[float] = []
+        self._stop = threading.Event()
+        self.status: Dict[str, Any] = {"pid": os.getpid(), "started_at": int(time.time()), "mode": "starting",
+                                       "polls": 0, "publishes": 0, "consecutive_failures": 0, "last_error": None}
+
+    def _write_status(self, **kw):
+        self.status.update(kw, updated_at=int(time.time()))
+        tmp = self.status_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.status, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, self.status_path)  # monitors never see a half-written file
+
+    def _provider(self):
+        if self.provider is None:
+            from .providers import FootballDataProvider
+            self.provider = FootballDataProvider()
+        if self.season is None:
+            from .publisher import detect_current_season_year
+            self.season = detect_current_season_year()
+        return self.provider
+
+    def cycle(self) -> float:
+        """One poll; returns the delay until the next one."""
+        matches = self._provider().season_matches(season=self.season)
+        # state được đọc lại mỗi vòng để không đè kết quả nhập tay (`eplbot result`) giữa các lần poll
+        L = League.from_state(load_state(self.state_path))
+        old_schedule = L.schedule_fingerprint()
+        added, _ = merge_season(L, matches)
+        if added or L.schedule_fingerprint() != old_schedule:
+            save_state(L.to_state(), path=self.state_path)
+            self.log(f"Synced {added} new result(s) (season={self.season}).")
+        self.kickoffs = kickoff_times(matches)
+        fp = L.fingerprint()
+        self.status.update(polls=self.status["polls"] + 1, last_ok_poll=int(time.time()), fingerprint=fp,
+                           results_count=len(L.results), season=self.season)
+        if (fp, L.schedule_fingerprint()) != self.published_fp:  # a rescheduled match moves the rounds too
+            rc = self.publish()
+            self.status.update(last_publish_at=int(time.time()), last_publish_status="ok" if rc == 0 else "failed")
+            if rc != 0:
+                raise RuntimeError(f"publish failed (exit code {rc})")
+            self.published_fp = (fp, L.schedule_fingerprint())
+            self.status["publishes"] += 1
+        return next_poll_delay(time.time(), self.kickoffs, self.live, self.idle)
+
+    def stop(self, *_):
+        self._stop.set()
+
+    def run(self, max_cycles: Optional[int] = None) -> int:
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            try:
+                signal.signal(sig, self.stop)
+            except ValueError:  # not in the main thread
+                pass
+        failures = 0
+        n = 0
+        while not self._stop.is_set():
+            try:
+                delay = self.cycle()
+                failures = 0
+                mode = "live" if in_kickoff_window(time.time(), self.kickoffs) else "idle"
+                self.status.update(consecutive_failures=0, last_error=None)
+            except Exception as e:
+                failures += 1
+                delay = backoff_delay(failures, self.backoff_base, self.max_backoff, _retry_after(e))
+                mode = "backoff"
+                self.status.update(consecutive_failures=failures, last_error=f"{type(e).__name__}: {e}",
+                                   last_error_at=int(time.time()))
+                self.log(f"Poll failed ({failures} in a row): {e}; retrying in {delay:.0f}s")
+            n += 1
+            if max_cycles is not None and n >= max_cycles:
+                break
+            self._write_status(mode=mode, next_poll_at=int(time.time() + delay))
+            self._stop.wait(delay)
+        self._write_status(mode="stopped", next_poll_at=None)
+        return 1 if failures else 0
@@ -0,0 +1,101 @@
+from __future__ import annotations
+from typing import Dict, Any, List, Tuple, Optional
+import os, json
+import numpy as np
+
+# Lịch sử xác suất theo từng snapshot: file nhị phân gồm các record kích thước cố định
+# (append = ghi thêm bytes vào cuối file), đọc lại bằng np.memmap nên không phải nạp cả mùa vào RAM.
+# Header (.json cạnh file) giữ danh sách đội theo thứ tự cột.
+
+FLAG_TOP4 = 1
+FLAG_SAFE = 2
+
+def history_dtype(T: int) -> np.dtype:
+    return np.dtype([
+        ("generated_at", "<i8"),
+        ("results_count", "<i4"),
+        ("sims", "<i4"),
+        ("fingerprint", "S64"),
+        ("probTop4", "<f4", (T,)),
+        ("probSafe", "<f4", (T,)),
+        ("points", "<i2", (T,)),
+        ("flags", "u1", (T,)),
+    ])
+
+def _load_header(path: str) -> Optional[Dict[str, Any]]:
+    if not os.path.exists(path + ".json"):
+        return None
+    with open(path + ".json", "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def append_history(path: str, snap: Dict[str, Any], teams: List[str]) -> bool:
+    """Append one record for this snapshot. Skipped (returns False) if the last record has the same fingerprint."""
+    header = _load_header(path)
+    if header is None:
+        header = {"version": 1, "teams": list(teams)}
+        with open(path + ".json", "w", encoding="utf-8") as f:
+            json.dump(header, f, ensure_ascii=False)
+    elif header["teams"] != list(teams):
+        raise ValueError(f"History file {path} was created for a different team list.")
+
+    T = len(teams)
+    dt = history_dtype(T)
+    meta = snap["meta"]
+    rows, _ = read_history(path)
+    if len(rows) and rows[-1]["fingerprint"].decode() == meta["fingerprint"]:
+        return False
+
+    col = {t: i for i, t in enumerate(teams)}
+    rec = np.zeros(1, dtype=dt)
+    rec["generated_at"] = meta["generated_at"]
+    rec["results_count"] = meta["results_count"]
+    rec["sims"] = meta["sims"]
+    rec["fingerprint"] = meta["fingerprint"].encode()
+    for r in snap["table"]:
+        i = col[r["team"]]
+        rec["probTop4"][0, i] = r["probTop4"] if r["probTop4"] is not None else np.nan
+        rec["probSafe"][0, i] = r["probSafe"] if r["probSafe"] is not None else np.nan
+        rec["points"][0, i] = r["points"]
+        rec["flags"][0, i] = (FLAG_TOP4 if r["official"]["top4"] else 0) | (FLAG_SAFE if r["official"]["safe"] else 0)
+    with open(path, "ab") as f:
+        f.truncate(len(rows) * dt.itemsize)  # drop a partial record left by an interrupted append
+        f.write(rec.tobytes())
+    return True
+
+def read_history(path: str) -> Tuple[np.ndarray, List[str]]:
+    """Zero-copy view of all records (np.memmap of the structured dtype) and the team order."""
+    header = _load_header(path)
+    if header is None:
+        return np.zeros(0, dtype=history_dtype(0)), []
+    dt = history_dtype(len(header["teams"]))
+    n = os.path.getsize(path) // dt.itemsize if os.path.exists(path) else 0
+    if n == 0:
+        return np.zeros(0, dtype=dt), header["teams"]
+    # shape ignores a partially written trailing record (interrupted append)
+    return np.memmap(path, dtype=dt, mode="r", shape=(n,)), header["teams"]
+
+def team_trend(path: str, team: str) -> List[Dict[str, Any]]:
+    rows, teams = read_history(path)
+    if team not in teams:
+        raise ValueError(f"Unknown team: {team}")
+    i = teams.index(team)
+    p4, ps, pts, fl = rows["probTop4"][:, i], rows["probSafe"][:, i], rows["points"][:, i], rows["flags"][:, i]
+    return [{"generated_at": int(rows["generated_at"][k]), "results_count": int(rows["results_count"][k]),
+             "probTop4": float(p4[k]), "probSafe": float(ps[k]), "points": int(pts[k]),
+             "top4": bool(fl[k] & FLAG_TOP4), "safe": bool(fl[k] & FLAG_SAFE)}
+            for k in range(len(rows))]
+
+def export_history_json(path: str, out: str) -> int:
+    """history.json for the web view: column arrays per field, per-team series as lists. Returns row count."""
+    rows, teams = read_history(path)
+    obj = {
+        "teams": teams,
+        "generated_at": rows["generated_at"].tolist(),
+        "results_count": rows["results_count"].tolist(),
+        "probTop4": {t: np.round(rows["probTop4"][:, i].astype(float), 4).tolist() for i, t in enumerate(teams)},
+        "probSafe": {t: np.round(rows["probSafe"][:, i].astype(float), 4).tolist() for i, t in enumerate(teams)},
+        "points": {t: rows["points"][:, i].tolist() for i, t in enumerate(teams)},
+    }
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(obj, f, ensure_ascii=False, separators=(",", ":"))
+    return len(rows)
@@ -28,7 +28,29 @@ def _add_match_constraints(problem, rem, W, D, L):
     for key in rem:
         problem += W[key] + D[key] + L[key] == 1, f"one_outcome_{key[0]}_{key[1]}"
 
+def _witness(league: League, team: str, need: int) -> bool:
+    """Cheap sufficient test before the ILP: build one completion where `team` loses every remaining match
+    and the other results go greedily to teams still below its points. If that already puts `need` other
+    teams level or above, the ILP would be feasible too, so it can be skipped."""
+    pts = {t: s.points for t, s in league.standings().items()}
+    target = pts[team]
+    for h, a in league.remaining_fixtures():
+        if team in (h, a):
+            pts[a if h == team else h] += 3
+            continue
+        short_h, short_a = pts[h] < target, pts[a] < target
+        if short_h and short_a:  # help the one closer to the line
+            pts[h if pts[h] >= pts[a] else a] += 3
+        elif short_h or short_a:
+            pts[h if short_h else a] += 3
+        else:
+            pts[h] += 1
+            pts[a] += 1
+    return sum(1 for t, p in pts.items() if t != team and p >= target) >= need
+
 def _feasible_eliminate_top4(league: League, team: str) -> bool:
+    if _witness(league, team, 4):
+        return True
     rem, W, D, L = _build_points_vars(league)
     prob = pulp.LpProblem("EliminateTop4", pulp.LpMinimize)
     _add_match_constraints(prob, rem, W, D, L)
@@ -48,6 +70,8 @@ def _feasible_eliminate_top4(league: League, team: str) -> bool:
     return pulp.LpStatus[prob.status] == "Optimal"
 
 def _feasible_relegate(league: League, team: str) -> bool:
+    if _witness(league, team, 17):
+        return True
     rem, W, D, L = _build_points_vars(league)
     prob = pulp.LpProblem("RelegationFeasible", pulp.LpMinimize)
     _add_match_constraints(prob, rem, W, D, L)
@@ -0,0 +1,82 @@
+"""Import-time breakdown per CLI subcommand.
+
+Runs each offline-capable subcommand as `python -X importtime -m eplbot.cli ...` in a scratch
+directory and reports total import time plus the cumulative cost of the heavy packages.
+The "eager" row imports every engine up front, i.e. what each command used to pay.
+
+    python -m eplbot.importbench [--repeat 3]
+"""
+from __future__ import annotations
+import argparse, os, re, subprocess, sys, tempfile
+from typing import Dict, List, Tuple
+
+HEAVY = ("numpy", "pulp", "rich", "requests", "boto3", "scipy")
+TEAMS = ",".join(f"Team {i:02d}" for i in range(1, 21))
+EAGER = ("import eplbot.cli, eplbot.snapshot, eplbot.publisher, eplbot.providers, eplbot.history, "
+         "rich.console, rich.table\ntry:\n    import boto3\nexcept Exception:\n    pass")
+
+_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)")
+
+def _parse(stderr: str) -> Tuple[int, Dict[str, int]]:
+    """Total self import time, and per heavy package the sum of self times of all its modules (us)."""
+    total = 0
+    heavy: Dict[str, int] = {}
+    for line in stderr.splitlines():
+        m = _LINE.match(line)
+        if not m:
+            continue
+        self_us, name = int(m.group(1)), m.group(4)
+        total += self_us
+        pkg = name.split(".", 1)[0]
+        if pkg in HEAVY:
+            heavy[pkg] = heavy.get(pkg, 0) + self_us
+    return total, heavy
+
+def _commands(state: str) -> List[Tuple[str, List[str]]]:
+    base = ["-m", "eplbot.cli", "--state", state]
+    return [
+        ("init", base + ["init", "--teams", TEAMS]),
+        ("result", base + ["result", "--home", "Team 01", "--away", "Team 02", "--hg", "1", "--ag", "0"]),
+        ("status --no-sim", base + ["status", "--no-sim"]),
+        ("status", base + ["status", "--sims", "200"]),
+        ("snapshot", base + ["snapshot", "--sims", "200", "--keep-sims", "--history", "history.bin"]),
+        ("whatif", base + ["whatif", "--pin", "Team 03;Team 04;H"]),
+        ("history", base + ["history"]),
+        ("publish --mode file", base + ["publish", "--sims", "200", "--mode", "file", "--dest", "pub/snapshot.json"]),
+    ]
+
+def run(repeat: int = 1) -> List[Tuple[str, int, Dict[str, int]]]:
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    # EPL_CACHE_DISABLE: a cache hit would skip the sim imports, and the bench states would fill the user's cache
+    env = dict(os.environ, PYTHONPATH=root + os.pathsep + os.environ.get("PYTHONPATH", ""), EPL_CACHE_DISABLE="1")
+    rows = []
+    best: Dict[str, Tuple[int, Dict[str, int]]] = {}
+    for _ in range(repeat):
+        with tempfile.TemporaryDirectory() as tmp:
+            state = os.path.join(tmp, "state.json")
+            runs = [("eager (all engines)", ["-c", EAGER])] + _commands(state)
+            for name, argv in runs:
+                p = subprocess.run([sys.executable, "-X", "importtime"] + argv, cwd=tmp, env=env,
+                                   capture_output=True, text=True)
+                if p.returncode not in (0, None):
+                    raise RuntimeError(f"{name} failed:\n{p.stderr[-2000:]}")
+                total, heavy = _parse(p.stderr)
+                if name not in best or total < best[name][0]:
+                    best[name] = (total, heavy)
+    for name in best:
+        rows.append((name, best[name][0], best[name][1]))
+    return rows
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog="eplbot.importbench", description=__doc__.splitlines()[0])
+    ap.add_argument("--repeat", type=int, default=1, help="Runs per command; the fastest is reported")
+    args = ap.parse_args(argv)
+    rows = run(args.repeat)
+    print(f"{'command':<22}{'imports ms':>11}  " + "".join(f"{h:>10}" for h in HEAVY))
+    for name, total, heavy in rows:
+        cells = "".join(f"{heavy[h] / 1000:>10.1f}" if h in heavy else f"{'-':>10}" for h in HEAVY)
+        print(f"{name:<22}{total / 1000:>11.1f}  {cells}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
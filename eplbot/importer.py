@@ -0,0 +1,117 @@
+from __future__ import annotations
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+import csv, json, os
+
+# Đọc file kết quả để back-fill (`eplbot import`): CSV, JSON, JSON lines, kể cả dump thô từ provider.
+# Mỗi dòng được chuẩn hoá về {"home", "away", "hg", "ag"}; dòng không đọc được thì mang lý do (_reason)
+# để lệnh import báo cáo chứ không bỏ qua im lặng.
+
+_CSV_COLUMNS = {
+    "home": ("home", "hometeam", "home_team", "team1"),
+    "away": ("away", "awayteam", "away_team", "team2"),
+    "hg": ("hg", "fthg", "home_goals", "homegoals", "home_score"),
+    "ag": ("ag", "ftag", "away_goals", "awaygoals", "away_score"),
+}
+_CSV_OPTIONAL = {"utcDate": ("utcdate", "date", "kickoff"), "matchday": ("matchday", "round", "wk", "gameweek")}
+_FINISHED = {"FINISHED", "FT", "AET", "PEN"}
+
+def _date(text: Optional[str]) -> Optional[str]:
+    """ISO dates pass through; dd/mm/yyyy and dd/mm/yy (football-data.co.uk) become yyyy-mm-dd."""
+    if not text:
+        return None
+    parts = text.split("/")
+    if len(parts) == 3 and all(p.isdigit() for p in parts):
+        d, m, y = parts
+        return f"{int(y) + 2000 if len(y) == 2 else int(y):04d}-{int(m):02d}-{int(d):02d}"
+    return text
+
+def _matchday(v: Any) -> Optional[int]:
+    text = str(v).rsplit("-", 1)[-1].strip() if v is not None else ""  # api-football: "Regular Season - 12"
+    return int(text) if text.isdigit() else None
+
+def _flatten(raw: Dict[str, Any]) -> Dict[str, Any]:
+    """Plain rows, football-data matches and api-football fixtures -> {home, away, hg, ag, utcDate, matchday}
+    (+ _reason). utcDate/matchday are None when the source lacks them."""
+    if "homeTeam" in raw:  # football-data /matches
+        status = raw.get("status")
+        score = (raw.get("score") or {}).get("fullTime") or {}
+        row = {"home": raw["homeTeam"].get("name"), "away": raw["awayTeam"].get("name"),
+               "hg": score.get("home"), "ag": score.get("away"), "utcDate": raw.get("utcDate"),
+               "matchday": raw.get("matchday")}
+    elif "teams" in raw and "goals" in raw:  # api-football /fixtures
+        fx = raw.get("fixture") or {}
+        status = (fx.get("status") or {}).get("short")
+        row = {"home": raw["teams"]["home"]["name"], "away": raw["teams"]["away"]["name"],
+               "hg": raw["goals"].get("home"), "ag": raw["goals"].get("away"), "utcDate": fx.get("date"),
+               "matchday": (raw.get("league") or {}).get("round")}
+    else:
+        status = raw.get("status")
+        row = {k: raw.get(k) for k in ("home", "away", "hg", "ag", "utcDate", "matchday")}
+    row["utcDate"], row["matchday"] = _date(row["utcDate"]), _matchday(row["matchday"])
+    if status is not None and status not in _FINISHED:
+        row["_reason"] = f"not finished (status={status})"
+    return row
+
+def _json_rows(obj: Any) -> List[Dict[str, Any]]:
+    if isinstance(obj, dict):
+        for key in ("results", "matches", "response"):  # state file, football-data, api-football
+            if isinstance(obj.get(key), list):
+                return obj[key]
+        raise ValueError("JSON object has no results/matches/response list")
+    if isinstance(obj, list):
+        return obj
+    raise ValueError("expected a JSON list or object")
+
+def _csv_rows(f) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    reader = csv.DictReader(f)
+    cols = {k.strip().lower(): k for k in (reader.fieldnames or [])}
+    pick = {field: next((cols[c] for c in names if c in cols), None) for field, names in _CSV_COLUMNS.items()}
+    missing = [field for field, col in pick.items() if col is None]
+    if missing:
+        raise ValueError(f"CSV header lacks columns for: {', '.join(missing)}")
+    opt = {field: next((cols[c] for c in names if c in cols), None) for field, names in _CSV_OPTIONAL.items()}
+    for line, rec in enumerate(reader, start=2):
+        row = {field: rec[col].strip() if rec[col] is not None else None for field, col in pick.items()}
+        row["utcDate"] = _date(rec[opt["utcDate"]]) if opt["utcDate"] else None
+        row["matchday"] = _matchday(rec[opt["matchday"]]) if opt["matchday"] else None
+        yield line, row
+
+def read_rows(path: str) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """Yield (location, row) for every record in path; the format follows the extension (.csv/.json/.jsonl)."""
+    ext = os.path.splitext(path)[1].lower()
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        if ext == ".csv":
+            for line, row in _csv_rows(f):
+                yield f"{path}:{line}", row
+        elif ext in (".jsonl", ".ndjson"):
+            for line, text in enumerate(f, start=1):
+                if not text.strip():
+                    continue
+                try:
+                    yield f"{path}:{line}", _flatten(json.loads(text))
+                except (ValueError, AttributeError, KeyError, TypeError) as e:
+                    yield f"{path}:{line}", {"_reason": f"unreadable record: {e}"}
+        elif ext == ".json":
+            for i, raw in enumerate(_json_rows(json.load(f))):
+                try:
+                    yield f"{path}[{i}]", _flatten(raw)
+                except (AttributeError, KeyError, TypeError) as e:
+                    yield f"{path}[{i}]", {"_reason": f"unreadable record: {e}"}
+        else:
+            raise ValueError(f"Unsupported file type: {path} (use .csv, .json or .jsonl)")
+
+def load_aliases(path: Optional[str]) -> Dict[str, str]:
+    """JSON object {"alias": "Team name as in state"}."""
+    if not path:
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def import_files(L, paths: List[str], aliases: Optional[Dict[str, str]] = None) -> Tuple[int, List[Tuple[str, str]], int]:
+    """Read all files and bulk_submit them into L. Returns (added, rejected [(location, reason)], rows read)."""
+    entries: List[Tuple[str, Dict[str, Any]]] = [e for path in paths for e in read_rows(path)]
+    readable = [i for i, (_, row) in enumerate(entries) if "_reason" not in row]
+    added, bad = L.bulk_submit([entries[i][1] for i in readable], aliases=aliases)
+    reasons = {i: row["_reason"] for i, (_, row) in enumerate(entries) if "_reason" in row}
+    reasons.update((readable[j], reason) for j, reason in bad)
+    return added, [(entries[i][0], reasons[i]) for i in sorted(reasons)], len(entries)
@@ -1,8 +1,9 @@
 from __future__ import annotations
 from dataclasses import dataclass, field
-from typing import Dict, List, Tuple, Any
+from typing import Dict, List, Tuple, Any, Iterable, Optional
 import itertools
 import random
+import hashlib
 
 @dataclass
 class TeamStats:
@@ -34,17 +35,30 @@ def _clean_teams(teams: List[str]) -> List[str]:
         raise ValueError(f"Premier League must have exactly 20 teams (got {len(cleaned)}).")
     return cleaned
 
+_SUFFIXES = {"fc", "afc"}
+
+def normalize_team(name: str) -> str:
+    """Loose key for matching provider/CSV spellings: case, punctuation, '&' and FC/AFC suffixes ignored."""
+    words = "".join(c if c.isalnum() else " " for c in name.lower().replace("&", " and ")).split()
+    return " ".join(w for w in words if w not in _SUFFIXES)
+
 @dataclass
 class League:
     teams: List[str]
     results: List[Dict[str, Any]] = field(default_factory=list)
+    # lịch thi đấu từ provider: {"home", "away", "matchday", "utcDate"}; rỗng nếu chưa sync lịch
+    schedule: List[Dict[str, Any]] = field(default_factory=list)
 
     @staticmethod
     def from_state(state: Dict[str, Any]) -> "League":
-        return League(teams=list(state.get("teams", [])), results=list(state.get("results", [])))
+        return League(teams=list(state.get("teams", [])), results=list(state.get("results", [])),
+                      schedule=list(state.get("schedule", [])))
 
     def to_state(self) -> Dict[str, Any]:
-        return {"teams": self.teams, "results": self.results}
+        st = {"teams": self.teams, "results": self.results}
+        if self.schedule:
+            st["schedule"] = self.schedule
+        return st
 
     @staticmethod
     def init_from_list(teams: List[str]) -> "League":
@@ -68,6 +82,62 @@ class League:
                     rem.append(k)
         return rem
 
+    def matchdays(self) -> Dict[Tuple[str, str], int]:
+        """(home, away) -> matchday for scheduled fixtures.
+
+        A postponed fixture keeps its original matchday, which would make it a "future" round dated in the
+        past. Unplayed fixtures of a matchday older than the current one (the latest matchday with more than
+        half of its fixtures played) are therefore folded into the first upcoming round whose last kickoff
+        is not before theirs (the last upcoming round if they are rescheduled after all of them)."""
+        md = {(f["home"], f["away"]): int(f["matchday"]) for f in self.schedule if f.get("matchday") is not None}
+        played = set((r["home"], r["away"]) for r in self.results)
+        size: Dict[int, int] = {}
+        done: Dict[int, int] = {}
+        for k, m in md.items():
+            size[m] = size.get(m, 0) + 1
+            done[m] = done.get(m, 0) + (k in played)
+        current = max((m for m in size if 2 * done[m] > size[m]), default=None)
+        if current is None:
+            return md
+        dates = {(f["home"], f["away"]): f.get("utcDate") for f in self.schedule}
+        last_kickoff: Dict[int, str] = {}
+        for k, m in md.items():
+            if k not in played and m >= current and dates.get(k):
+                last_kickoff[m] = max(last_kickoff.get(m, ""), dates[k])
+        upcoming = sorted({m for k, m in md.items() if k not in played and m >= current})
+        overdue = [k for k, m in md.items() if k not in played and m < current]
+        final = max((md[k] for k in overdue), default=None)
+        for k in overdue:
+            if upcoming:
+                d = dates.get(k)
+                md[k] = next((u for u in upcoming if not d or d <= last_kickoff.get(u, d)), upcoming[-1])
+            else:  # only postponed games left: one final round
+                md[k] = final
+        return md
+
+    def matchday_dates(self) -> Dict[int, str]:
+        """matchday -> earliest kickoff (ISO UTC) in that round; fixtures folded into a later round by
+        matchdays() don't count, so an old postponed date can't pull the round into the past."""
+        md = self.matchdays()
+        out: Dict[int, str] = {}
+        for f in self.schedule:
+            m, d = f.get("matchday"), f.get("utcDate")
+            if m is not None and d and md.get((f["home"], f["away"])) == int(m) and (int(m) not in out or d < out[int(m)]):
+                out[int(m)] = d
+        return out
+
+    def set_schedule(self, fixtures: List[Dict[str, Any]]) -> int:
+        """Replace the schedule with provider fixtures of known teams. Returns number of fixtures kept."""
+        self.schedule = [{"home": f["home"], "away": f["away"], "matchday": f.get("matchday"), "utcDate": f.get("utcDate")}
+                         for f in fixtures if f["home"] in self.teams and f["away"] in self.teams]
+        return len(self.schedule)
+
+    def schedule_fingerprint(self) -> str:
+        m = hashlib.sha256()
+        for f in self.schedule:
+            m.update(f'{f["home"]}|{f["away"]}|{f.get("matchday")}|{f.get("utcDate")}'.encode())
+        return m.hexdigest()
+
     def standings(self) -> Dict[str, TeamStats]:
         stats: Dict[str, TeamStats] = {t: TeamStats(team=t) for t in self.teams}
         for r in self.results:
@@ -97,6 +167,54 @@ class League:
                 raise ValueError("This fixture has already been recorded.")
         self.results.append({"home": home, "away": away, "hg": int(hg), "ag": int(ag)})
 
+    def team_index(self, aliases: Optional[Dict[str, str]] = None) -> Dict[str, str]:
+        """normalize_team(name or alias) -> team name; ambiguous keys are left out."""
+        idx: Dict[str, Optional[str]] = {}
+        for name, team in [(t, t) for t in self.teams] + list((aliases or {}).items()):
+            if team not in self.teams:
+                raise ValueError(f"Alias {name!r} points to unknown team {team!r}.")
+            k = normalize_team(name)
+            idx[k] = team if idx.get(k, team) == team else None
+        return {k: v for k, v in idx.items() if v is not None}
+
+    def bulk_submit(self, rows: Iterable[Dict[str, Any]], aliases: Optional[Dict[str, str]] = None
+                    ) -> Tuple[int, List[Tuple[int, str]]]:
+        """Validate and add many results in one pass (hash-indexed duplicate check instead of
+        submit_result's scan). Team names go through team_index, so aliases and spelling variants resolve.
+
+        Returns (added, rejected) with rejected = [(row index, reason)] for every row not added.
+        """
+        index = self.team_index(aliases)
+        recorded = {(r["home"], r["away"]): (int(r["hg"]), int(r["ag"])) for r in self.results}
+        added = 0
+        rejected: List[Tuple[int, str]] = []
+        for i, row in enumerate(rows):
+            try:
+                home, away = row["home"], row["away"]
+                hg, ag = int(row["hg"]), int(row["ag"])
+            except (KeyError, TypeError, ValueError) as e:
+                rejected.append((i, f"missing or invalid field: {e}"))
+                continue
+            if hg < 0 or ag < 0:
+                rejected.append((i, f"negative score {hg}-{ag}"))
+                continue
+            h, a = index.get(normalize_team(str(home))), index.get(normalize_team(str(away)))
+            if h is None or a is None:
+                rejected.append((i, "unknown team: " + ", ".join(str(n) for n, t in ((home, h), (away, a)) if t is None)))
+                continue
+            if h == a:
+                rejected.append((i, f"home and away are the same team ({h})"))
+                continue
+            prev = recorded.get((h, a))
+            if prev is not None:
+                rejected.append((i, f"{h} vs {a} already recorded" +
+                                 ("" if prev == (hg, ag) else f" as {prev[0]}-{prev[1]} (conflicts with {hg}-{ag})")))
+                continue
+            recorded[(h, a)] = (hg, ag)
+            self.results.append({"home": h, "away": a, "hg": hg, "ag": ag})
+            added += 1
+        return added, rejected
+
     def table_view(self) -> List[TeamStats]:
         stats = self.standings()
         return sorted(stats.values(), key=lambda s: (-s.points, -s.gd, -s.gf, s.team))
@@ -104,5 +222,13 @@ class League:
     def validate_complete(self) -> bool:
         return len(self.results) == 380
 
+    def fingerprint(self, upto: int = None) -> str:
+        """sha256 over results (optionally only the first `upto`, i.e. an earlier state of this league)."""
+        m = hashlib.sha256()
+        for r in self.results[:upto]:
+            m.update(f'{r["home"]}|{r["away"]}|{r["hg"]}|{r["ag"]}'.encode())
+        return m.hexdigest()
+
     def copy(self) -> "League":
-        return League(teams=list(self.teams), results=[dict(r) for r in self.results])
+        return League(teams=list(self.teams), results=[dict(r) for r in self.results],
+                      schedule=[dict(f) for f in self.schedule])
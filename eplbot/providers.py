@@ -1,9 +1,11 @@
 from __future__ import annotations
-import os
+import logging, os
 import requests
 from typing import Dict, List, Any, Tuple, Optional
 from datetime import datetime
 
+log = logging.getLogger(__name__)
+
 class FootballDataProvider:
     """football-data.org v4
     Docs: https://www.football-data.org/documentation/api
@@ -64,6 +66,28 @@ class FootballDataProvider:
             })
         return matches
 
+    def season_matches(self, season: Optional[int] = None) -> List[Dict[str, Any]]:
+        """All matches of the season in one request (any status), with kickoff time, matchday and status.
+        Finished ones carry the full-time score; used by sync (results + schedule) and the daemon."""
+        params = {"season": season} if season else {}
+        url = f"{self.base_url}/competitions/PL/matches"
+        r = self.session.get(url, params=params, timeout=30)
+        r.raise_for_status()
+        out = []
+        for m in r.json().get("matches", []):
+            score = m.get("score", {}).get("fullTime", {})
+            out.append({
+                "utcDate": m.get("utcDate"),
+                "matchday": m.get("matchday"),
+                "status": m.get("status"),
+                "home": m["homeTeam"]["name"],
+                "away": m["awayTeam"]["name"],
+                "hg": int(score.get("home") or 0),
+                "ag": int(score.get("away") or 0),
+                "id": m.get("id"),
+            })
+        return out
+
 class ApiFootballProvider:
     """API-FOOTBALL (api-sports.io)
     Docs: https://www.api-football.com/documentation-v3
@@ -121,3 +145,39 @@ class ApiFootballProvider:
             }
             out.append(match)
         return out
+
+    # fixture.status.short -> football-data style status used by sync/daemon (every documented code;
+    # anything else is logged and passed through as-is, so it is neither polled as pending nor merged)
+    _STATUS = {"FT": "FINISHED", "AET": "FINISHED", "PEN": "FINISHED", "AWD": "AWARDED", "WO": "AWARDED",
+               "NS": "SCHEDULED", "TBD": "SCHEDULED", "PST": "POSTPONED", "CANC": "CANCELLED",
+               "ABD": "CANCELLED", "SUSP": "SUSPENDED", "INT": "SUSPENDED", "HT": "PAUSED", "BT": "PAUSED",
+               "1H": "IN_PLAY", "2H": "IN_PLAY", "ET": "IN_PLAY", "P": "IN_PLAY", "LIVE": "IN_PLAY"}
+
+    def _status(self, short: str) -> str:
+        status = self._STATUS.get(short)
+        if status is None:
+            log.warning("api-football: unknown fixture status %r, treated as not pending", short)
+            return short or "UNKNOWN"
+        return status
+
+    def season_matches(self, season: int) -> List[Dict[str, Any]]:
+        """All fixtures of the season with kickoff, matchday (parsed from 'Regular Season - N') and status."""
+        url = f"{self.base_url}/fixtures"
+        r = self.session.get(url, params={"league": 39, "season": season}, timeout=40)
+        r.raise_for_status()
+        out = []
+        for resp in r.json().get("response", []):
+            fx = resp.get("fixture", {})
+            rnd = (resp.get("league", {}).get("round") or "").rsplit("-", 1)[-1].strip()
+            short = (fx.get("status") or {}).get("short", "")
+            out.append({
+                "utcDate": fx.get("date"),
+                "matchday": int(rnd) if rnd.isdigit() else None,
+                "status": self._status(short),
+                "home": resp["teams"]["home"]["name"],
+                "away": resp["teams"]["away"]["name"],
+                "hg": int(resp["goals"].get("home") or 0),
+                "ag": int(resp["goals"].get("away") or 0),
+                "id": fx.get("id"),
+            })
+        return out
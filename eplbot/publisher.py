@@ -1,13 +1,16 @@
 from __future__ import annotations
-import os, json
-from typing import Optional
+import os, json, time, hashlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, Any, List, Callable, Tuple
 import requests
 
-try:
-    import boto3
-    _HAS_BOTO3 = True
-except Exception:
-    _HAS_BOTO3 = False
+def _boto3():
+    """boto3 is only probed when an S3 upload actually happens."""
+    try:
+        import boto3
+    except Exception:
+        raise RuntimeError("boto3 not installed. pip install boto3")
+    return boto3
 
 
 def _fd_headers() -> dict:
@@ -37,7 +40,37 @@ def publish_file(snapshot_path: str, dest_path: str) -> str:
         dst.write(src.read())
     return f"file://{os.path.abspath(dest_path)}"
 
-def publish_gist(snapshot_path: str, gist_id: str, token: Optional[str] = None, filename: str = "snapshot.json") -> str:
+def load_manifest(path: str) -> Optional[Dict[str, Any]]:
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception:
+        return None
+
+def save_manifest(path: str, snap: Dict[str, Any], urls: Dict[str, str]) -> None:
+    """Lưu manifest của lần publish gần nhất (meta + bảng) để so sánh/tính delta lần sau."""
+    obj = {"published_at": snap["meta"]["generated_at"], "urls": urls, "snapshot": snap}
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(obj, f, ensure_ascii=False)
+
+def snapshot_changed(meta: Dict[str, Any], manifest: Optional[Dict[str, Any]],
+                     targets: Optional[List[str]] = None) -> bool:
+    """So sánh fingerprint kết quả + lịch (matchday, ảnh hưởng tới rounds) + sims/seed/sampler với manifest;
+    bỏ qua generated_at.
+    Target nào trong `targets` chưa có URL trong manifest (vừa thêm vào --mode, hoặc lần trước lỗi) thì
+    coi như đã đổi, để lệnh đi tiếp tới bước upload (target đã có nội dung trùng hash vẫn được bỏ qua)."""
+    if not manifest:
+        return True
+    urls = manifest.get("urls") or {}
+    if any(not urls.get(t) for t in targets or ()):
+        return True
+    old = dict({"sampler": "iid"}, **manifest.get("snapshot", {}).get("meta", {}))
+    return any(old.get(k) != meta.get(k) for k in ("fingerprint", "schedule_fingerprint", "sims", "seed", "sampler"))
+
+def publish_gist(snapshot_path: str, gist_id: str, token: Optional[str] = None, filename: str = "snapshot.json",
+                 extra_paths: Optional[List[str]] = None) -> str:
     token = token or os.environ.get("GITHUB_TOKEN")
     if not token:
         raise RuntimeError("GITHUB_TOKEN not set for gist publish")
@@ -47,6 +80,9 @@ def publish_gist(snapshot_path: str, gist_id: str, token: Optional[str] = None,
 
     url = f"https://api.github.com/gists/{gist_id}"
     payload = {"files": {filename: {"content": content}}}
+    for extra in extra_paths or []:
+        with open(extra, "r", encoding="utf-8") as f:
+            payload["files"][os.path.basename(extra)] = {"content": f.read()}
     r = requests.patch(
         url,
         headers={
@@ -61,14 +97,118 @@ def publish_gist(snapshot_path: str, gist_id: str, token: Optional[str] = None,
     raw_url = data["files"][filename]["raw_url"]
     return raw_url
 
-def publish_s3(snapshot_path: str, bucket: str, key: str, region: Optional[str] = None, public: bool = True) -> str:
-    if not _HAS_BOTO3:
-        raise RuntimeError("boto3 not installed. pip install boto3")
-    s3 = boto3.client("s3", region_name=region)
-    extra = {"ContentType": "application/json"}
+def publish_s3(snapshot_path: str, bucket: str, key: str, region: Optional[str] = None, public: bool = True,
+               content_encoding: Optional[str] = None) -> str:
+    s3 = _boto3().client("s3", region_name=region)
+    extra = {"ContentType": "application/json", "CacheControl": "no-cache"}
+    if content_encoding:
+        extra["ContentEncoding"] = content_encoding
     if public:
         extra["ACL"] = "public-read"
     s3.upload_file(snapshot_path, bucket, key, ExtraArgs=extra)
     if region in (None, "", "us-east-1"):
         return f"https://{bucket}.s3.amazonaws.com/{key}"
     return f"https://{bucket}.s3.{region}.amazonaws.com/{key}"
+
+
+# --- Multi-target publishing -------------------------------------------------
+# Mỗi target là một callable trả về (url, uploaded); uploaded=False nghĩa là nội dung
+# phía remote đã trùng hash nên không upload lại.
+PublishObject = Tuple[str, str, Optional[str]]  # (local path, dest path / key / filename, content-encoding)
+
+def _md5_file(path: str) -> str:
+    with open(path, "rb") as f:
+        return hashlib.md5(f.read()).hexdigest()
+
+def _sha256_file(path: str) -> str:
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+def file_target(objects: List[PublishObject]) -> Callable[[], Tuple[str, bool]]:
+    def run():
+        uploaded = False
+        for src, dest, _ in objects:
+            if os.path.exists(dest) and _sha256_file(dest) == _sha256_file(src):
+                continue
+            publish_file(src, dest)
+            uploaded = True
+        return f"file://{os.path.abspath(objects[0][1])}", uploaded
+    return run
+
+def gist_target(paths: List[str], gist_id: str, token: Optional[str] = None) -> Callable[[], Tuple[str, bool]]:
+    """Chỉ PATCH gist khi nội dung một trong các file khác với bản hiện tại trên gist."""
+    def run():
+        tok = token or os.environ.get("GITHUB_TOKEN")
+        if not tok:
+            raise RuntimeError("GITHUB_TOKEN not set for gist publish")
+        headers = {"Authorization": f"token {tok}", "Accept": "application/vnd.github+json"}
+        r = requests.get(f"https://api.github.com/gists/{gist_id}", headers=headers, timeout=30)
+        r.raise_for_status()
+        files = r.json().get("files", {})
+        main_name = os.path.basename(paths[0])
+        same = True
+        for path in paths:
+            remote = files.get(os.path.basename(path))
+            if remote is None:
+                same = False
+                break
+            content = remote.get("content")
+            if remote.get("truncated"):
+                content = requests.get(remote["raw_url"], timeout=30).text
+            with open(path, "r", encoding="utf-8") as f:
+                if f.read() != content:
+                    same = False
+                    break
+        if same:
+            return files[main_name]["raw_url"], False
+        return publish_gist(paths[0], gist_id=gist_id, token=tok, filename=main_name, extra_paths=paths[1:]), True
+    return run
+
+def s3_target(objects: List[PublishObject], bucket: str, region: Optional[str] = None,
+              public: bool = True) -> Callable[[], Tuple[str, bool]]:
+    """Bỏ qua từng object nếu ETag trên S3 trùng MD5 file local (upload single-part)."""
+    def run():
+        s3 = _boto3().client("s3", region_name=region)
+        uploaded = False
+        url = None
+        for src, key, enc in objects:
+            try:
+                etag = s3.head_object(Bucket=bucket, Key=key)["ETag"].strip('"')
+            except Exception:
+                etag = None
+            if etag == _md5_file(src):
+                continue
+            publish_s3(src, bucket=bucket, key=key, region=region, public=public, content_encoding=enc)
+            uploaded = True
+        key = objects[0][1]
+        if region in (None, "", "us-east-1"):
+            url = f"https://{bucket}.s3.amazonaws.com/{key}"
+        else:
+            url = f"https://{bucket}.s3.{region}.amazonaws.com/{key}"
+        return url, uploaded
+    return run
+
+def publish_to_targets(targets: Dict[str, Callable[[], Tuple[str, bool]]], retries: int = 3,
+                       backoff: float = 1.0) -> List[Dict[str, Any]]:
+    """Publish song song tới mọi target, retry riêng từng target (backoff luỹ thừa).
+
+    Trả về báo cáo mỗi target: {target, status: uploaded|skipped|failed, url, attempts, error}.
+    retries < 1 được tính là 1 lần thử.
+    """
+    retries = max(1, retries)
+    def attempt(name, fn):
+        for i in range(1, retries + 1):
+            try:
+                url, uploaded = fn()
+                return {"target": name, "status": "uploaded" if uploaded else "skipped",
+                        "url": url, "attempts": i, "error": None}
+            except Exception as e:
+                if i == retries:
+                    return {"target": name, "status": "failed", "url": None, "attempts": i, "error": str(e)}
+                time.sleep(backoff * 2 ** (i - 1))
+
+    if not targets:
+        return []
+    with ThreadPoolExecutor(max_workers=len(targets)) as pool:
+        futures = [pool.submit(attempt, name, fn) for name, fn in targets.items()]
+        return [f.result() for f in futures]
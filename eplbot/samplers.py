@@ -0,0 +1,2 @@
+# Tên các sampler của mô phỏng, tách khỏi sim.py để CLI dựng --sampler mà không phải import numpy.
+SAMPLERS = ("iid", "antithetic", "stratified", "sobol")
@@ -0,0 +1,260 @@
+"""Local snapshot server: `eplbot serve`.
+
+Serves snapshot.json (plus .gz/.br variants), history.json and index.html from memory with
+ETag/If-None-Match, reloads them when the files change on disk, and pushes the new fingerprint
+to browsers over server-sent events (GET /events). Plain asyncio streams, no extra dependencies;
+an idle SSE client is one parked coroutine, so thousands of them fit on a single core.
+"""
+from __future__ import annotations
+import asyncio, gzip, hashlib, json, os, time
+from typing import Dict, Optional, Tuple
+
+HEARTBEAT = 15.0      # SSE comment line so proxies/browsers keep idle streams open
+KEEPALIVE = 60.0      # idle timeout between requests on a keep-alive connection
+WRITE_TIMEOUT = 10.0  # a client that cannot take a few KB in this time is dropped
+MAX_HEADER = 16384
+
+_REASONS = {200: "OK", 304: "Not Modified", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed"}
+_CTYPES = {".json": "application/json; charset=utf-8", ".html": "text/html; charset=utf-8"}
+
+class Asset:
+    """One file held in memory: identity bytes plus compressed representations, keyed by Content-Encoding."""
+
+    def __init__(self, body: bytes, ctype: str, variants: Dict[str, bytes]):
+        self.digest = hashlib.sha256(body).hexdigest()
+        self.ctype = ctype
+        self.bodies = dict(variants, identity=body)
+        self.etags = {enc: f'"{self.digest}"' if enc == "identity" else f'"{self.digest}-{enc}"'
+                      for enc in self.bodies}
+
+    def pick(self, accept_encoding: str) -> str:
+        accepted = set()
+        for tok in accept_encoding.split(","):
+            name, _, params = tok.strip().partition(";")
+            if params.replace(" ", "") not in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+                accepted.add(name.strip().lower())
+        for enc in ("br", "gzip"):
+            if enc in self.bodies and (enc in accepted or "*" in accepted):
+                return enc
+        return "identity"
+
+def _stat_key(path: str) -> Optional[Tuple[int, int]]:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+def _read(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+def _load_asset(path: str, inject: bytes = b"") -> Asset:
+    body = _read(path)
+    if inject:
+        body = body.replace(b"<script>", inject + b"<script>", 1)
+    variants = {}
+    # Precompressed siblings from `snapshot --precompress` are only used if they match the file
+    # (a reload can race with a write); otherwise gzip once here.
+    if os.path.exists(path + ".gz") and not inject:
+        try:
+            gz = _read(path + ".gz")
+            if gzip.decompress(gz) == body:
+                variants["gzip"] = gz
+        except (OSError, EOFError):
+            pass
+    if os.path.exists(path + ".br") and not inject:
+        try:
+            import brotli
+            br = _read(path + ".br")
+            if brotli.decompress(br) == body:
+                variants["br"] = br
+        except Exception:
+            pass
+    if "gzip" not in variants:
+        variants["gzip"] = gzip.compress(body, compresslevel=9, mtime=0)
+    return Asset(body, _CTYPES.get(os.path.splitext(path)[1], "application/octet-stream"), variants)
+
+class SnapshotServer:
+    """Routes: / and /index.html, /snapshot.json, /history.json, /events (SSE), /healthz."""
+
+    def __init__(self, snapshot_path: str, index_path: Optional[str] = None, history_path: Optional[str] = None,
+                 poll: float = 1.0):
+        self.paths = {"/snapshot.json": snapshot_path}
+        if history_path:
+            self.paths["/history.json"] = history_path
+        if index_path:
+            self.paths["/index.html"] = index_path
+        self.poll = poll
+        self.assets: Dict[str, Asset] = {}
+        self._keys: Dict[str, tuple] = {}
+        self.fingerprint: Optional[str] = None
+        self.loaded_at = 0.0
+        self.clients = 0
+        self._event_id: Optional[str] = None
+        self._event_msg = b""
+        self._changed = asyncio.Event()
+
+    # ---- file watching ----
+    def reload(self) -> bool:
+        """Re-read files whose (mtime, size) changed. Returns True if the snapshot changed."""
+        changed = False
+        for route, path in self.paths.items():
+            key = tuple(_stat_key(p) for p in (path, path + ".gz", path + ".br"))
+            if key == self._keys.get(route):
+                continue
+            if key[0] is None:
+                self.assets.pop(route, None)
+                self._keys[route] = key
+                continue
+            try:
+                asset = _load_asset(path, b"<script>window.EPL_SERVE = true;</script>\n  "
+                                    if route == "/index.html" else b"")
+                if route == "/snapshot.json":
+                    meta = json.loads(asset.bodies["identity"]).get("meta", {})
+            except (OSError, ValueError):
+                continue  # half-written file; keep serving the old one and retry on the next poll
+            self.assets[route] = asset
+            self._keys[route] = key
+            if route == "/snapshot.json" and asset.digest != self._event_id:
+                self.fingerprint = meta.get("fingerprint")
+                self.loaded_at = time.time()
+                self._publish(asset.digest, meta)
+                changed = True
+        return changed
+
+    def _publish(self, etag: str, meta: dict):
+        data = json.dumps({"fingerprint": meta.get("fingerprint"), "etag": f'"{etag}"',
+                           "generated_at": meta.get("generated_at"), "results_count": meta.get("results_count")})
+        self._event_id = etag
+        self._event_msg = f"id: {etag}\nevent: snapshot\ndata: {data}\n\n".encode()
+        # wake every parked SSE client once, then give later waiters a fresh event
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def watch(self):
+        while True:
+            await asyncio.sleep(self.poll)
+            self.reload()
+
+    # ---- HTTP ----
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                try:
+                    head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), KEEPALIVE)
+                except (asyncio.TimeoutError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+                    break
+                lines = head.decode("latin-1").split("\r\n")
+                try:
+                    method, target, version = lines[0].split(" ", 2)
+                except ValueError:
+                    writer.write(self._response(400, {}, b"bad request\n"))
+                    break
+                headers = {}
+                for line in lines[1:]:
+                    k, sep, v = line.partition(":")
+                    if sep:
+                        headers[k.strip().lower()] = v.strip()
+                path = target.split("?", 1)[0]
+                if path == "/":
+                    path = "/index.html"
+                if method not in ("GET", "HEAD"):
+                    writer.write(self._response(405, {"Allow": "GET, HEAD"}, b"method not allowed\n"))
+                    break
+                if path == "/events" and method == "GET":
+                    await self._events(writer, headers)
+                    break
+                conn = headers.get("connection", "").lower()
+                keep = conn != "close" if version == "HTTP/1.1" else conn == "keep-alive"
+                writer.write(self._serve(path, headers, head=method == "HEAD", keep=keep))
+                await asyncio.wait_for(writer.drain(), WRITE_TIMEOUT)
+                if not keep:
+                    break
+        except (ConnectionError, asyncio.TimeoutError):
+            pass
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except (ConnectionError, OSError):
+                pass
+
+    def _serve(self, path: str, headers: Dict[str, str], head: bool, keep: bool) -> bytes:
+        conn = {"Connection": "keep-alive" if keep else "close"}
+        if path == "/healthz":
+            body = json.dumps({"fingerprint": self.fingerprint, "loaded_at": self.loaded_at,
+                               "clients": self.clients}).encode()
+            return self._response(200, dict(conn, **{"Content-Type": _CTYPES[".json"]}), body, head)
+        asset = self.assets.get(path)
+        if asset is None:
+            return self._response(404, conn, b"not found\n", head)
+        enc = asset.pick(headers.get("accept-encoding", ""))
+        h = dict(conn, **{"ETag": asset.etags[enc], "Cache-Control": "no-cache", "Vary": "Accept-Encoding",
+                          "Content-Type": asset.ctype})
+        if enc != "identity":
+            h["Content-Encoding"] = enc
+        inm = headers.get("if-none-match")
+        if inm:
+            tags = {t.strip().removeprefix("W/") for t in inm.split(",")}
+            if "*" in tags or tags & set(asset.etags.values()):
+                return self._response(304, h, b"", head=True)
+        return self._response(200, h, asset.bodies[enc], head)
+
+    @staticmethod
+    def _response(status: int, headers: Dict[str, str], body: bytes = b"", head: bool = False) -> bytes:
+        lines = [f"HTTP/1.1 {status} {_REASONS[status]}", "Access-Control-Allow-Origin: *"]
+        lines += [f"{k}: {v}" for k, v in headers.items()]
+        if status != 304:
+            lines.append(f"Content-Length: {len(body)}")
+        return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + (b"" if head else body)
+
+    async def _events(self, writer: asyncio.StreamWriter, headers: Dict[str, str]):
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nCache-Control: no-cache\r\n"
+                     b"Connection: keep-alive\r\nAccess-Control-Allow-Origin: *\r\nX-Accel-Buffering: no\r\n\r\n"
+                     b"retry: 5000\n\n")
+        last = headers.get("last-event-id")  # EventSource resends it on reconnect; skip what it already has
+        self.clients += 1
+        try:
+            while True:
+                if self._event_id is not None and self._event_id != last:
+                    last = self._event_id
+                    writer.write(self._event_msg)
+                await asyncio.wait_for(writer.drain(), WRITE_TIMEOUT)
+                changed = self._changed
+                if self._event_id != last:
+                    continue
+                try:
+                    await asyncio.wait_for(changed.wait(), HEARTBEAT)
+                except asyncio.TimeoutError:
+                    writer.write(b": ping\n\n")
+        finally:
+            self.clients -= 1
+
+def _raise_fd_limit():
+    """Each client is a socket; lift the soft RLIMIT_NOFILE (often 1024) up to the hard limit."""
+    try:
+        import resource
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        if hard == resource.RLIM_INFINITY or hard > 65536:
+            hard = 65536
+        if soft < hard:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    except (ImportError, ValueError, OSError):
+        pass
+
+async def serve(snapshot_path: str, index_path: Optional[str] = None, history_path: Optional[str] = None,
+                host: str = "127.0.0.1", port: int = 8000, poll: float = 1.0, ready=None):
+    """Run until cancelled. `ready(server, sockets)` is called once listening (used by the CLI to print the URL)."""
+    _raise_fd_limit()
+    app = SnapshotServer(snapshot_path, index_path, history_path, poll)
+    app.reload()
+    srv = await asyncio.start_server(app.handle, host, port, limit=MAX_HEADER, backlog=4096)
+    if ready:
+        ready(app, srv.sockets)
+    watcher = asyncio.create_task(app.watch())
+    try:
+        async with srv:
+            await srv.serve_forever()
+    finally:
+        watcher.cancel()
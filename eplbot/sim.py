@@ -1,9 +1,144 @@
 from __future__ import annotations
-from typing import Dict, List, Tuple
+from typing import Dict, List, Tuple, Optional, Any
+import json, os, tempfile, warnings
 import numpy as np
 from .league import League
+from .samplers import SAMPLERS
 
-def estimate_probabilities(league: League, sims: int = 20000, seed: int = 12345):
+OUTCOME_CODES = {"H": 0, "D": 1, "A": 2}  # same coding as the simulated outcomes: 0=home win, 1=draw, 2=away win
+
+def _block_sizes(sims: int, replicates: int) -> np.ndarray:
+    return np.diff(np.linspace(0, sims, replicates + 1).astype(np.int64))
+
+def _draw_outcomes(rng, sims: int, M: int, sampler: str, replicates: int) -> np.ndarray:
+    """(sims, M) outcome codes. Non-iid samplers produce `replicates` independent contiguous blocks,
+    each with its own internal structure, so standard errors can be read off the block spread.
+
+    antithetic: each row u is paired with 1-u, i.e. H<->A swapped, D kept.
+    stratified: within a block every fixture gets (as near as possible) equal H/D/A counts,
+                randomly permuted per fixture (Latin-hypercube style).
+    sobol:      scrambled Sobol points in M dims (one scramble per block), outcome = floor(3u).
+                Sobol balance only holds for power-of-two block sizes; others (20000 sims / 16 blocks
+                = 1250) are a prefix of the sequence, still low-discrepancy but without that guarantee.
+    """
+    if sampler == "iid":
+        return rng.integers(0, 3, size=(sims, M), endpoint=False)
+    if sampler == "sobol":
+        try:
+            from scipy.stats import qmc
+        except Exception:
+            raise RuntimeError("scipy not installed (needed for sampler=sobol). pip install scipy")
+    blocks = []
+    for n in _block_sizes(sims, replicates):
+        if sampler == "antithetic":
+            half = rng.integers(0, 3, size=(n // 2, M))
+            block = [half, 2 - half]
+            if n % 2:
+                block.append(rng.integers(0, 3, size=(1, M)))
+            blocks.append(np.vstack(block))
+        elif sampler == "stratified":
+            base = np.tile((np.arange(n) % 3)[:, None], (1, M))
+            blocks.append(rng.permuted(base, axis=0))
+        elif sampler == "sobol":
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore", UserWarning)  # scipy's balance warning, see docstring
+                u = qmc.Sobol(d=M, scramble=True, seed=rng).random(n)
+            blocks.append(np.minimum((3 * u).astype(np.int64), 2))
+        else:
+            raise ValueError(f"Unknown sampler {sampler!r}; choose from {', '.join(SAMPLERS)}")
+    return np.vstack(blocks)
+
+def standard_errors(data: np.ndarray, meta: Dict[str, Any]):
+    """Per-team standard errors of the top-4 / safe estimates from a stored outcome matrix.
+
+    iid: binomial sqrt(p(1-p)/n). Other samplers: spread of the per-block estimates over the
+    independent replicate blocks, std(block means) / sqrt(blocks).
+    """
+    teams = meta["teams"]
+    T = len(teams)
+    M = len(meta["fixtures"])
+    ranks = np.asarray(data[:, M:M + T])
+    ind4 = ranks < 4
+    inds = ranks < T - 3
+    n = ranks.shape[0]
+    R = min(meta.get("replicates", 1), n)  # fewer sims than blocks would leave empty (NaN) blocks
+    if meta.get("sampler", "iid") == "iid" or R < 2:  # one block has no spread: binomial fallback
+        p4, ps = ind4.mean(axis=0), inds.mean(axis=0)
+        se4, ses = np.sqrt(p4 * (1 - p4) / n), np.sqrt(ps * (1 - ps) / n)
+    else:
+        edges = np.concatenate([[0], np.cumsum(_block_sizes(n, R))])
+        b4 = np.array([ind4[lo:hi].mean(axis=0) for lo, hi in zip(edges[:-1], edges[1:])])
+        bs = np.array([inds[lo:hi].mean(axis=0) for lo, hi in zip(edges[:-1], edges[1:])])
+        se4, ses = b4.std(axis=0, ddof=1) / np.sqrt(R), bs.std(axis=0, ddof=1) / np.sqrt(R)
+    return ({teams[i]: float(se4[i]) for i in range(T)}, {teams[i]: float(ses[i]) for i in range(T)})
+
+_HOME_PTS = np.array([3, 1, 0], dtype=np.int32)  # indexed by outcome code
+_AWAY_PTS = np.array([0, 1, 3], dtype=np.int32)
+
+def _accumulate_rounds(outcomes: np.ndarray, H: np.ndarray, A: np.ndarray, base_pts: np.ndarray,
+                       eps: np.ndarray, round_of: List[Optional[int]]):
+    """Add simulated points fixture by fixture in matchday order and, at the end of every scheduled
+    matchday, count who sits in the top 4 / bottom 3. Fixtures without a matchday only count at season end.
+
+    Returns (final points (sims, T), rounds) with rounds = {"matchdays", "top4", "drop"} (probabilities,
+    one row of T per matchday, team order as the points columns), or None if nothing is scheduled.
+    """
+    sims, T = eps.shape
+    pts = np.broadcast_to(base_pts, (sims, T)).astype(np.int32)
+    order = sorted(range(len(H)), key=lambda k: (round_of[k] is None, round_of[k] or 0))
+    mds, top4, drop = [], [], []
+    tiebreak = None
+    for pos, k in enumerate(order):
+        o = outcomes[:, k]
+        pts[:, H[k]] += _HOME_PTS[o]
+        pts[:, A[k]] += _AWAY_PTS[o]
+        r = round_of[k]
+        if r is not None and (pos + 1 == len(order) or round_of[order[pos + 1]] != r):
+            if tiebreak is None:
+                # eps as a per-row rank, so (points, eps) fits one int key without ties
+                tiebreak = np.argsort(np.argsort(eps, axis=1), axis=1).astype(np.int32)
+            key = pts * T + tiebreak
+            srt = np.sort(key, axis=1)  # only the 4th-highest / 3rd-lowest thresholds are needed
+            top4.append((key >= srt[:, T - 4:T - 3]).sum(axis=0) / sims)
+            drop.append((key <= srt[:, 2:3]).sum(axis=0) / sims)
+            mds.append(r)
+    if not mds:
+        return pts, None
+    return pts, {"matchdays": mds, "top4": np.round(top4, 4).tolist(), "drop": np.round(drop, 4).tolist()}
+
+def _rerank(league: League, outcomes: np.ndarray, fixtures: List[Tuple[str, str]], seed: int):
+    """Final positions (sims, T) uint8 and per-matchday rounds for an outcome matrix over `fixtures`, ranked
+    from the current standings (incremental runs: the stored positions belong to the older state)."""
+    teams = list(league.teams)
+    T = len(teams)
+    idx = {t: i for i, t in enumerate(teams)}
+    stats = league.standings()
+    base_pts = np.array([stats[t].points for t in teams], dtype=np.int32)
+    H = np.array([idx[h] for h, _ in fixtures], dtype=np.int32)
+    A = np.array([idx[a] for _, a in fixtures], dtype=np.int32)
+    n = len(outcomes)
+    eps = np.random.default_rng([seed, len(league.results), 1]).random((n, T)) * 1e-9
+    md = league.matchdays()
+    pts, rounds = _accumulate_rounds(outcomes, H, A, base_pts, eps, [md.get(f) for f in fixtures])
+    order = np.argsort(-(pts + eps), axis=1)
+    ranks = np.empty((n, T), dtype=np.uint8)
+    ranks[np.arange(n)[:, None], order] = np.arange(T, dtype=np.uint8)
+    return ranks, rounds
+
+def estimate_probabilities(league: League, sims: int = 20000, seed: int = 12345, outcomes_path: Optional[str] = None,
+                           return_outcomes: bool = False, sampler: str = "iid", replicates: int = 16):
+    """Monte Carlo top-4 / safe probabilities.
+
+    sampler selects how fixture outcomes are drawn (see _draw_outcomes); "iid" is the original plain
+    sampling and reproduces earlier results exactly. Use standard_errors() on the returned outcomes to
+    compare samplers.
+
+    If outcomes_path is given, the per-sim fixture outcomes and final positions are saved there as a
+    (sims, M+T) uint8 .npy (plus a .json sidecar) so what-if queries can be answered by masking.
+    With return_outcomes=True the same (data, meta) pair is returned as a third element
+    (None when no fixtures remain). When the league has a schedule, meta["rounds"] holds per-matchday
+    top-4 / drop-zone probabilities, accumulated in the same pass (see _accumulate_rounds).
+    """
     rng = np.random.default_rng(seed)
     teams = list(league.teams)
     T = len(teams)
@@ -20,31 +155,20 @@ def estimate_probabilities(league: League, sims: int = 20000, seed: int = 12345)
         bottom3 = set(order[-3:])
         prob_top4 = {t: (1.0 if i in top4 else 0.0) for t,i in idx.items()}
         prob_safe = {t: (0.0 if i in bottom3 else 1.0) for t,i in idx.items()}
+        if return_outcomes:
+            return prob_top4, prob_safe, None
         return prob_top4, prob_safe
 
     H = np.array([idx[h] for (h,_) in rem], dtype=np.int32)
     A = np.array([idx[a] for (_,a) in rem], dtype=np.int32)
     M = len(rem)
 
-    pts = np.broadcast_to(base_pts, (sims, T)).copy()
-
-    outcomes = rng.integers(0, 3, size=(sims, M), endpoint=False)
-
-    for k in range(M):
-        o = outcomes[:, k]
-        h = H[k]; a = A[k]
-        hw = (o == 0)
-        if hw.any():
-            pts[hw, h] += 3
-        dr = (o == 1)
-        if dr.any():
-            pts[dr, h] += 1
-            pts[dr, a] += 1
-        aw = (o == 2)
-        if aw.any():
-            pts[aw, a] += 3
-
+    replicates = max(1, min(replicates, sims))  # every block needs at least one sim
+    outcomes = _draw_outcomes(rng, sims, M, sampler, replicates)
     eps = rng.random((sims, T)) * 1e-9
+    md = league.matchdays()
+    pts, rounds = _accumulate_rounds(outcomes, H, A, base_pts, eps, [md.get(f) for f in rem])
+
     score = pts + eps
     order = np.argsort(-score, axis=1)
 
@@ -61,6 +185,213 @@ def estimate_probabilities(league: League, sims: int = 20000, seed: int = 12345)
         bottom_hits += np.bincount(bottom3[:, j], minlength=T)
     safe_counts = sims - bottom_hits
 
+    kept = None
+    if outcomes_path or return_outcomes:
+        ranks = np.empty((sims, T), dtype=np.uint8)
+        ranks[np.arange(sims)[:, None], order] = np.arange(T, dtype=np.uint8)
+        kept = (np.hstack([outcomes.astype(np.uint8), ranks]),
+                {"teams": teams, "fixtures": [list(f) for f in rem], "results_count": len(league.results),
+                 "fingerprint": league.fingerprint(), "sims": sims, "seed": seed,
+                 "sampler": sampler, "replicates": replicates, "rounds": rounds})
+        if outcomes_path:
+            save_outcomes(outcomes_path, *kept)
+
     prob_top4 = {teams[i]: top4_counts[i] / sims for i in range(T)}
     prob_safe  = {teams[i]: safe_counts[i] / sims  for i in range(T)}
+    if return_outcomes:
+        return prob_top4, prob_safe, kept
     return prob_top4, prob_safe
+
+
+def _replace_with(path: str, write) -> None:
+    """Write via a temp file in the same directory and os.replace it over path: readers (including ones
+    holding an mmap of the old file) see either the old or the new file, never a partial one."""
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            write(f)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+def save_outcomes(path: str, data: np.ndarray, meta: Dict[str, Any]) -> None:
+    """Matrix first, sidecar last; load_outcomes rejects a pair caught between the two replaces."""
+    _replace_with(path, lambda f: np.save(f, data))
+    _replace_with(path + ".json", lambda f: f.write(json.dumps(meta, ensure_ascii=False).encode("utf-8")))
+
+def load_outcomes(path: str) -> Tuple[np.ndarray, Dict[str, Any]]:
+    """Memory-mapped (sims, M+T) matrix: first M columns are outcomes, last T are final positions (0-based).
+    Raises ValueError if the matrix does not have the shape its sidecar describes (mid-rewrite)."""
+    with open(path + ".json", "r", encoding="utf-8") as f:
+        meta = json.load(f)
+    data = np.load(path, mmap_mode="r")
+    expected = (meta.get("sims", data.shape[0]), len(meta["fixtures"]) + len(meta["teams"]))
+    if data.ndim != 2 or data.shape != expected:
+        raise ValueError(f"{path} has shape {data.shape}, sidecar expects {expected}; sims are being rewritten")
+    return data, meta
+
+def _outcome_code(hg: int, ag: int) -> int:
+    return 0 if hg > ag else (1 if hg == ag else 2)
+
+def reusable_rows(league: League, data: np.ndarray, meta: Dict[str, Any]) -> Optional[np.ndarray]:
+    """Stored outcomes of the still-remaining fixtures, (sims, M) in league.remaining_fixtures() order.
+
+    Only applies when the current results are a strict extension (same teams, old results as a prefix)
+    of the stored state. Every stored sim is kept: fixtures are independent, so each row's draws for the
+    remaining fixtures are still a valid sample once the newly played ones are set to the observed H/D/A.
+    Those columns are dropped rather than overwritten because their points are already in the current
+    standings; the stored final positions are stale, so the caller re-ranks (see _rerank).
+    """
+    n_old = meta.get("results_count")
+    if n_old is None or meta["teams"] != list(league.teams) or n_old > len(league.results):
+        return None
+    if league.fingerprint(upto=n_old) != meta["fingerprint"]:
+        return None
+    col = {tuple(f): k for k, f in enumerate(meta["fixtures"])}
+    if any((r["home"], r["away"]) not in col for r in league.results[n_old:]):
+        return None
+    return np.asarray(data[:, [col[f] for f in league.remaining_fixtures()]])
+
+def incremental_probabilities(league: League, sims: int, seed: int, store_path: str, sampler: str = "iid"):
+    """estimate_probabilities that reuses the outcome matrix stored at store_path by the previous run.
+
+    All stored sims are carried over (see reusable_rows) and re-ranked under the current standings; iid
+    runs are topped up with fresh sims (or truncated) to reach `sims`, with the top-up seed derived from
+    (seed, results count) so a given history always replays to the same numbers. The other samplers only
+    reuse a matrix of exactly `sims` rows, since topping up or truncating would break their replicate
+    blocks. The matrix is written back to store_path. Returns (prob_top4, prob_safe, (data, meta)), with
+    meta["reused"] = number of stored sims carried over.
+    """
+    reused, old_meta = None, None
+    if os.path.exists(store_path) and os.path.exists(store_path + ".json"):
+        try:
+            old, old_meta = load_outcomes(store_path)
+            if (old_meta.get("seed") == seed and old_meta.get("sampler", "iid") == sampler
+                    and (sampler == "iid" or old_meta.get("sims") == sims)):
+                reused = reusable_rows(league, old, old_meta)
+        except Exception:
+            reused = None
+    if reused is not None and len(reused) > sims:
+        reused = reused[:sims]
+    n_reused = 0 if reused is None else len(reused)
+
+    rem = league.remaining_fixtures()
+    if not rem:
+        p4, ps = estimate_probabilities(league, sims=sims, seed=seed, sampler=sampler)
+        return p4, ps, None
+
+    if n_reused < sims:
+        top_up = int(np.random.SeedSequence([seed, len(league.results)]).generate_state(1)[0])
+        _, _, (fresh, meta) = estimate_probabilities(league, sims=sims - n_reused, seed=top_up, return_outcomes=True,
+                                                     sampler=sampler)
+        if not n_reused:
+            data = fresh
+        else:
+            outcomes = np.vstack([reused, fresh[:, :len(rem)]])
+            ranks, rounds = _rerank(league, outcomes, rem, seed)
+            data = np.hstack([outcomes, ranks])
+            meta = dict(meta, rounds=rounds)
+    else:
+        ranks, rounds = _rerank(league, reused, rem, seed)
+        data = np.hstack([reused, ranks])
+        meta = {"teams": list(league.teams), "fixtures": [list(f) for f in rem], "results_count": len(league.results),
+                "fingerprint": league.fingerprint(), "replicates": old_meta.get("replicates", 1), "rounds": rounds}
+    meta = dict(meta, sims=sims, seed=seed, reused=n_reused, sampler=sampler)
+    save_outcomes(store_path, data, meta)
+    p4, ps, _ = conditional_probabilities(data, meta, [])
+    return p4, ps, (data, meta)
+
+def parse_pin(text: str) -> Tuple[str, str, int]:
+    """'Home;Away;H|D|A' -> (home, away, outcome code)."""
+    parts = [x.strip() for x in text.split(";")]
+    if len(parts) != 3:
+        raise ValueError(f"Pin must look like Home;Away;H|D|A (got {text!r}).")
+    home, away, res = parts
+    if res.upper() not in OUTCOME_CODES:
+        raise ValueError(f"Outcome must be H, D or A (got {res!r}).")
+    return home, away, OUTCOME_CODES[res.upper()]
+
+def conditional_probabilities(data: np.ndarray, meta: Dict[str, Any], pins: List[Tuple[str, str, int]]):
+    """Top-4/safe probabilities restricted to the stored sims consistent with every pinned outcome.
+
+    Returns (prob_top4, prob_safe, n_matching). n_matching shrinks roughly 3x per pin, so few pins only.
+    """
+    teams = meta["teams"]
+    T = len(teams)
+    M = len(meta["fixtures"])
+    fx = {tuple(f): k for k, f in enumerate(meta["fixtures"])}
+    mask = np.ones(data.shape[0], dtype=bool)
+    for home, away, code in pins:
+        k = fx.get((home, away))
+        if k is None:
+            raise ValueError(f"{home} vs {away} is not a remaining fixture in the stored simulation.")
+        mask &= data[:, k] == code
+    n = int(mask.sum())
+    if n == 0:
+        raise ValueError("No stored simulation matches these outcomes; rerun with more sims.")
+    ranks = data[mask, M:M + T]
+    top4 = (ranks < 4).mean(axis=0)
+    safe = (ranks < T - 3).mean(axis=0)
+    prob_top4 = {teams[i]: float(top4[i]) for i in range(T)}
+    prob_safe = {teams[i]: float(safe[i]) for i in range(T)}
+    return prob_top4, prob_safe, n
+
+def fixture_leverage(data: np.ndarray, meta: Dict[str, Any], chunk: int = 4096) -> List[Dict[str, Any]]:
+    """Per remaining fixture, conditional top-4/safe probability of every team under each outcome (H/D/A).
+
+    All fixture x outcome x team counts come from one grouped count over the stored sims: for each
+    chunk of sims, a one-hot (sims, 3M) outcome matrix is multiplied by the (sims, T) top-4 / safe
+    indicators. Fixtures are returned sorted by leverage = sum over teams of the max-min swing.
+    """
+    teams = meta["teams"]
+    T = len(teams)
+    M = len(meta["fixtures"])
+    n = np.zeros(3 * M, dtype=np.float64)
+    top4 = np.zeros((3 * M, T), dtype=np.float64)
+    safe = np.zeros((3 * M, T), dtype=np.float64)
+    cols = 3 * np.arange(M)
+    for lo in range(0, data.shape[0], chunk):
+        block = np.asarray(data[lo:lo + chunk])
+        rows = np.arange(block.shape[0])[:, None]
+        onehot = np.zeros((block.shape[0], 3 * M), dtype=np.float32)
+        onehot[rows, cols + block[:, :M]] = 1.0
+        ranks = block[:, M:M + T]
+        n += onehot.sum(axis=0)
+        top4 += onehot.T @ (ranks < 4).astype(np.float32)
+        safe += onehot.T @ (ranks < T - 3).astype(np.float32)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        top4 = (top4 / n[:, None]).reshape(M, 3, T)
+        safe = (safe / n[:, None]).reshape(M, 3, T)
+    n = n.reshape(M, 3).astype(np.int64)
+    swing4 = np.nanmax(top4, axis=1) - np.nanmin(top4, axis=1)
+    swings = np.nanmax(safe, axis=1) - np.nanmin(safe, axis=1)
+    score = np.nansum(swing4, axis=1) + np.nansum(swings, axis=1)
+
+    out = []
+    for k in np.argsort(-score):
+        home, away = meta["fixtures"][k]
+        out.append({
+            "home": home, "away": away,
+            "leverage": float(score[k]),
+            "n": n[k].tolist(),
+            "teams": [{"team": teams[t],
+                       "top4": [None if np.isnan(x) else float(x) for x in top4[k, :, t]],
+                       "safe": [None if np.isnan(x) else float(x) for x in safe[k, :, t]],
+                       "swing": float(np.nan_to_num(swing4[k, t]) + np.nan_to_num(swings[k, t]))}
+                      for t in np.argsort(-(np.nan_to_num(swing4[k]) + np.nan_to_num(swings[k])))],
+        })
+    return out
+
+def summarize_leverage(lev: List[Dict[str, Any]], top: int = 10, min_swing: float = 0.01) -> List[Dict[str, Any]]:
+    """Top fixtures only, keeping teams whose odds swing by at least min_swing; probabilities rounded to 1e-4."""
+    def r(v):
+        return [None if x is None else round(x, 4) for x in v]
+    out = []
+    for f in lev[:top]:
+        out.append({"home": f["home"], "away": f["away"], "leverage": round(f["leverage"], 4),
+                    "teams": [{"team": t["team"], "top4": r(t["top4"]), "safe": r(t["safe"])}
+                              for t in f["teams"] if t["swing"] >= min_swing]})
+    return out
@@ -1,14 +1,76 @@
 from __future__ import annotations
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 from .league import League
 from .ilp_check import guaranteed_top4, guaranteed_safe
-from .sim import estimate_probabilities
-import time, json, hashlib
+from .history import append_history
+from .sim import fixture_leverage, summarize_leverage
+from .cache import ProbabilityCache, cached_probabilities
+from concurrent.futures import ThreadPoolExecutor
+import time, json, hashlib, gzip, os
 
-def build_snapshot(L: League, sims: int = 20000, seed: int = 12345) -> Dict[str, Any]:
-    flags_top4 = {t: guaranteed_top4(L, t) for t in L.teams}
-    flags_safe = {t: guaranteed_safe(L, t) for t in L.teams}
-    probs_top4, probs_safe = estimate_probabilities(L, sims=sims, seed=seed)
+def results_fingerprint(L: League) -> str:
+    return L.fingerprint()
+
+def outcomes_path_for(snapshot_path: str) -> str:
+    """Where the per-sim outcome matrix is kept next to a snapshot (snapshot.json -> snapshot.sims.npy)."""
+    return os.path.splitext(snapshot_path)[0] + ".sims.npy"
+
+def default_workers() -> int:
+    """Worker budget for build_snapshot: EPL_WORKERS, else the CPU count. Raises ValueError if
+    EPL_WORKERS is not a positive integer."""
+    env = os.environ.get("EPL_WORKERS")
+    if not env:
+        return os.cpu_count() or 1
+    try:
+        n = int(env)
+    except ValueError:
+        n = 0
+    if n < 1:
+        raise ValueError(f"EPL_WORKERS must be a positive integer, got {env!r}")
+    return n
+
+def _timed(fn, *args, **kwargs):
+    t0 = time.perf_counter()
+    out = fn(*args, **kwargs)
+    return out, t0, time.perf_counter()
+
+def build_snapshot(L: League, sims: int = 20000, seed: int = 12345, outcomes_path: Optional[str] = None,
+                   leverage_top: int = 0, incremental: bool = False, sampler: str = "iid",
+                   history_path: Optional[str] = None, cache: Optional[ProbabilityCache] = None,
+                   workers: Optional[int] = None) -> Dict[str, Any]:
+    """incremental=True reuses the outcome matrix previously stored at outcomes_path (see incremental_probabilities).
+    history_path: append this snapshot's per-team probabilities/flags/points to that history file.
+    cache: probability cache to consult (meta.cache records hit/miss; incremental runs bypass it).
+    workers: threads shared by the stages (default default_workers()). The Monte Carlo stage (then leverage,
+    which needs its sims) takes one; the official checks, one CBC solve per team and flag, fill the rest, so
+    wall time approaches the slower stage instead of the sum. meta.timings records each stage."""
+    if workers is None:
+        workers = default_workers()
+    elif workers < 1:
+        raise ValueError(f"workers must be at least 1, got {workers}")
+    t_start = time.perf_counter()
+    store_path = outcomes_path if incremental else None
+
+    def probabilities():
+        res, t0, t1 = _timed(cached_probabilities, L, sims=sims, seed=seed, sampler=sampler, cache=cache,
+                             store_path=store_path, outcomes_path=None if incremental else outcomes_path,
+                             need_outcomes=bool(leverage_top))
+        kept = res[4]
+        lev, t2 = None, t1
+        if leverage_top and kept is not None:
+            lev, _, t2 = _timed(lambda: summarize_leverage(fixture_leverage(*kept), top=leverage_top))
+        return res, lev, t1 - t0, t2 - t1
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        sim_job = pool.submit(probabilities)  # first in the queue: the longest single task
+        checks = {(kind, t): pool.submit(_timed, fn, L, t)
+                  for kind, fn in (("top4", guaranteed_top4), ("safe", guaranteed_safe)) for t in L.teams}
+        (probs_top4, probs_safe, (se_top4, se_safe), rounds, kept, hit), leverage, t_sim, t_lev = sim_job.result()
+        done = {k: f.result() for k, f in checks.items()}
+    flags_top4 = {t: done[("top4", t)][0] for t in L.teams}
+    flags_safe = {t: done[("safe", t)][0] for t in L.teams}
+    spans = [(t0, t1) for _, t0, t1 in done.values()]
+    t_table = time.perf_counter()
 
     table_rows = []
     for i, s in enumerate(L.table_view(), start=1):
@@ -20,25 +82,148 @@ def build_snapshot(L: League, sims: int = 20000, seed: int = 12345) -> Dict[str,
             "official": {"top4": flags_top4.get(s.team, False), "safe": flags_safe.get(s.team, False)},
             "probTop4": probs_top4.get(s.team, None),
             "probSafe": probs_safe.get(s.team, None),
+            "seTop4": se_top4.get(s.team, 0.0),
+            "seSafe": se_safe.get(s.team, 0.0),
         })
 
-    m = hashlib.sha256()
-    for r in L.results:
-        m.update(f'{r["home"]}|{r["away"]}|{r["hg"]}|{r["ag"]}'.encode())
-
-    return {
+    snap = {
         "meta": {
             "generated_at": int(time.time()),
             "sims": sims,
             "seed": seed,
+            "sampler": sampler,
             "results_count": len(L.results),
             "teams_count": len(L.teams),
-            "fingerprint": m.hexdigest(),
+            "fingerprint": results_fingerprint(L),
+            "schedule_fingerprint": L.schedule_fingerprint(),
+            "workers": workers,
         },
         "table": table_rows,
         "remaining": L.remaining_fixtures(),
     }
+    if rounds:
+        snap["rounds"] = rounds_section(L, rounds)
+    if cache is not None:
+        snap["meta"]["cache"] = "off" if incremental else ("hit" if hit else "miss")
+    if incremental and kept is not None:
+        snap["meta"]["reused_sims"] = kept[1]["reused"]
+    if leverage is not None:
+        snap["leverage"] = leverage
+    now = time.perf_counter()
+    snap["meta"]["timings"] = {  # seconds; official = first solve start to last solve end, solver = summed solves
+        "official": round(max(e for _, e in spans) - min(s for s, _ in spans), 4) if spans else 0.0,
+        "official_solver": round(sum(e - s for s, e in spans), 4),
+        "probabilities": round(t_sim, 4),
+        "leverage": round(t_lev, 4),
+        "table": round(now - t_table, 4),
+        "total": round(now - t_start, 4),
+    }
+    if history_path:
+        append_history(history_path, snap, L.teams)
+    return snap
+
+def rounds_section(L: League, rounds: Dict[str, Any]) -> Dict[str, Any]:
+    """Per-matchweek trajectories for charts: for each future matchday (and its first kickoff), every team's
+    probability of being top 4 / in the bottom 3 once that round is played."""
+    dates = L.matchday_dates()
+    return {
+        "matchdays": rounds["matchdays"],
+        "dates": [dates.get(md) for md in rounds["matchdays"]],
+        "probTop4": {t: [row[i] for row in rounds["top4"]] for i, t in enumerate(L.teams)},
+        "probDrop": {t: [row[i] for row in rounds["drop"]] for i, t in enumerate(L.teams)},
+    }
+
+def compact_snapshot(obj: Dict[str, Any]) -> Dict[str, Any]:
+    """Compact form: fixtures as [home_idx, away_idx] into the table order, probabilities/SEs rounded to 1e-5."""
+    teams = [r["team"] for r in obj["table"]]
+    idx = {t: i for i, t in enumerate(teams)}
+    rows = []
+    for r in obj["table"]:
+        r = dict(r)
+        for k in ("probTop4", "probSafe", "seTop4", "seSafe"):
+            if r.get(k) is not None:
+                r[k] = round(float(r[k]), 5)
+        rows.append(r)
+    out = {k: v for k, v in obj.items() if k not in ("table", "remaining")}
+    out["meta"] = dict(obj["meta"], format="compact")
+    out["table"] = rows
+    out["remaining"] = [[idx[h], idx[a]] for h, a in obj.get("remaining", [])]
+    return out
+
+def expand_snapshot(obj: Dict[str, Any]) -> Dict[str, Any]:
+    """Inverse of compact_snapshot; full-format snapshots are returned unchanged."""
+    if obj.get("meta", {}).get("format") != "compact":
+        return obj
+    teams = [r["team"] for r in obj["table"]]
+    out = dict(obj)
+    out["remaining"] = [[teams[h], teams[a]] for h, a in obj.get("remaining", [])]
+    return out
+
+def write_snapshot_file(obj: Dict[str, Any], path: str, compact: bool = False, precompress: bool = False) -> str:
+    """Write the snapshot and return its content hash (sha256 of the bytes written, usable as ETag).
+
+    compact=True writes minified JSON with index-encoded fixtures and adds meta.content_hash
+    (hash of the body without that field). precompress=True also writes .gz (and .br if the
+    brotli package is installed) siblings next to path.
+    """
+    if compact:
+        obj = compact_snapshot(obj)
+        body = json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+        obj["meta"]["content_hash"] = hashlib.sha256(body.encode("utf-8")).hexdigest()
+        data = json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    else:
+        data = json.dumps(obj, ensure_ascii=False, indent=2).encode("utf-8")
+    with open(path, "wb") as f:
+        f.write(data)
+    variants = {}
+    if precompress:
+        variants[".gz"] = gzip.compress(data, compresslevel=9, mtime=0)
+        try:
+            import brotli
+            variants[".br"] = brotli.compress(data, quality=11)
+        except ImportError:
+            pass
+    for ext in (".gz", ".br"):
+        if ext in variants:
+            with open(path + ext, "wb") as f:
+                f.write(variants[ext])
+        elif os.path.exists(path + ext):
+            os.remove(path + ext)  # never leave a stale sibling next to a fresh snapshot
+    return hashlib.sha256(data).hexdigest()
+
+def compressed_siblings(path: str) -> Dict[str, str]:
+    """Existing precompressed variants of path, keyed by Content-Encoding."""
+    return {enc: path + ext for enc, ext in (("gzip", ".gz"), ("br", ".br")) if os.path.exists(path + ext)}
+
+
+_DELTA_META = ("generated_at", "fingerprint", "schedule_fingerprint", "results_count", "sims", "seed", "sampler")
+
+def _delta_value(v):
+    return round(v, 5) if isinstance(v, float) else v  # same precision as compact_snapshot
+
+def build_delta(prev: Dict[str, Any], cur: Dict[str, Any]) -> Dict[str, Any]:
+    """Compact delta between two snapshots: for each table row that changed, its team plus only the fields
+    that changed (probabilities/SEs compared at the compact 1e-5 rounding), and the fixtures played since."""
+    prev_rows = {r["team"]: r for r in prev.get("table", [])}
+    changed = []
+    for r in cur.get("table", []):
+        old = prev_rows.get(r["team"], {})
+        diff = {k: _delta_value(v) for k, v in r.items()
+                if k not in old or _delta_value(v) != _delta_value(old[k])}
+        if diff:
+            changed.append({"team": r["team"], **diff})
+    cur_rem = set(map(tuple, cur.get("remaining", [])))
+    played = [list(f) for f in prev.get("remaining", []) if tuple(f) not in cur_rem]
+    return {
+        "meta": {k: cur["meta"][k] for k in _DELTA_META if k in cur["meta"]},
+        "base_fingerprint": prev.get("meta", {}).get("fingerprint"),
+        "changed": changed,
+        "played": played,
+    }
 
-def write_snapshot_file(obj: Dict[str, Any], path: str) -> None:
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(obj, f, ensure_ascii=False, indent=2)
+def write_delta_file(delta: Dict[str, Any], path: str) -> str:
+    """Write a build_delta result as minified JSON and return its sha256."""
+    data = json.dumps(delta, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    with open(path, "wb") as f:
+        f.write(data)
+    return hashlib.sha256(data).hexdigest()
@@ -1,5 +1,5 @@
 from __future__ import annotations
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 from .state import load_state, save_state
 from .league import League
 
@@ -19,3 +19,10 @@ def merge_finished_matches(L: League, finished: List[Dict[str, Any]], strict_nam
         existing.add(key)
         added += 1
     return added
+
+def merge_season(L: League, matches: List[Dict[str, Any]]) -> Tuple[int, int]:
+    """Merge a provider's season_matches(): finished ones become results, all of them (with matchday and
+    kickoff) become the schedule used for per-matchweek probabilities. Returns (added results, scheduled fixtures)."""
+    added = merge_finished_matches(L, [m for m in matches if m.get("status") == "FINISHED"])
+    scheduled = L.set_schedule([m for m in matches if m.get("matchday") is not None])
+    return added, scheduled
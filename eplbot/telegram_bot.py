@@ -1,23 +1,44 @@
 import os
-import json, time, hashlib, os, requests
+import asyncio
+import json, logging, time, hashlib, os, requests, threading
 from typing import List
 from telegram import Update, ReplyKeyboardMarkup, KeyboardButton
 from telegram.ext import Application, CommandHandler, ContextTypes
 from .state import load_state, save_state
 from .league import League
-from .ilp_check import guaranteed_top4, guaranteed_safe
-from .sim import estimate_probabilities
 from .providers import FootballDataProvider, ApiFootballProvider
-from .sync import merge_finished_matches
+from .sync import merge_season
+from .cache import default_cache
 from telegram.constants import ParseMode
 
+log = logging.getLogger(__name__)
+
 STATE_PATH = os.environ.get("EPL_STATE", "league_state.json")
 CACHE_PATH = os.environ.get("EPL_CACHE", "last_status_cache.json")
 _last_status = {"text": None, "meta": None}
 SNAPSHOT_FILE = os.environ.get("EPL_SNAPSHOT_FILE", "snapshot.json")
 SNAPSHOT_URL  = os.environ.get("EPL_SNAPSHOT_URL")
+PRECOMPUTE_INTERVAL = int(os.environ.get("EPL_PRECOMPUTE_INTERVAL", "60"))
+PRECOMPUTE_SIMS = int(os.environ.get("EPL_PRECOMPUTE_SIMS", "20000"))
+PRECOMPUTE_SEED = 12345
+SIMS_FILE = os.environ.get("EPL_SIMS_FILE", "last_status_sims.npy")
+HISTORY_FILE = os.environ.get("EPL_HISTORY_FILE", "history.bin")
+
+_prob_cache = default_cache()  # shared with the CLI (EPL_CACHE_DIR); EPL_CACHE_DISABLE=1 disables it
+# Kết quả tính sẵn bởi job nền; chỉ tính lại khi fingerprint state hoặc snapshot URL đổi.
+# Không có SNAPSHOT_URL thì snapshot.json cục bộ được đọc lại mỗi khi (mtime, size) của nó đổi.
+_precomputed = {"key": None, "computed_at": None, "status_text": None, "table_text": None,
+                "meta": None, "snapshot": None, "snapshot_etag": None, "snapshot_stamp": None}
+# Các lần precompute (job định kỳ + _request_precompute) chạy tuần tự; lần đến sau chờ rồi chỉ so key.
+_precompute_lock = threading.Lock()
+_cache_lock = threading.Lock()  # _save_cache được gọi cả từ thread precompute lẫn event loop
 
 async def usesnapshot_cmd(update, context):
+    obj = _precomputed["snapshot"]
+    if obj is not None:
+        txt = _format_snapshot_table(obj) + _staleness_line()
+        await update.message.reply_text(txt, parse_mode=ParseMode.HTML)
+        return
     obj = _load_snapshot_local()
     if obj is None and SNAPSHOT_URL:
         obj = _refresh_snapshot_from_url()
@@ -33,6 +54,7 @@ async def refreshsnapshot_cmd(update, context):
         return
     try:
         obj = _refresh_snapshot_from_url()
+        _precomputed["snapshot"] = obj
         txt = _format_snapshot_table(obj)
         await update.message.reply_text("Đã cập nhật snapshot từ URL.\n" + txt, parse_mode=ParseMode.HTML)
     except Exception as e:
@@ -47,6 +69,14 @@ def _load_snapshot_local():
     except Exception:
         return None
 
+def _local_snapshot_stamp():
+    """(mtime, size) của SNAPSHOT_FILE, None nếu chưa có: đổi là đọc lại file."""
+    try:
+        st = os.stat(SNAPSHOT_FILE)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
 def _refresh_snapshot_from_url():
     if not SNAPSHOT_URL:
         return None
@@ -110,10 +140,119 @@ def _load_cache():
 
 def _save_cache(text: str, meta: dict):
     obj = {"text": text, "meta": meta}
-    with open(CACHE_PATH, "w", encoding="utf-8") as f:
+    with _cache_lock:
+        with open(CACHE_PATH, "w", encoding="utf-8") as f:
+            json.dump(obj, f, ensure_ascii=False, indent=2)
+        _last_status["text"] = text
+        _last_status["meta"] = meta
+
+def _fetch_snapshot_if_changed():
+    """GET có điều kiện (If-None-Match) tới SNAPSHOT_URL; trả None nếu snapshot không đổi."""
+    headers = {}
+    if _precomputed["snapshot_etag"]:
+        headers["If-None-Match"] = _precomputed["snapshot_etag"]
+    r = requests.get(SNAPSHOT_URL, headers=headers, timeout=30)
+    if r.status_code == 304:
+        return None
+    if r.status_code != 200:
+        raise RuntimeError(f"Fetch snapshot failed: {r.text[:200]}")
+    obj = r.json()
+    with open(SNAPSHOT_FILE, "w", encoding="utf-8") as f:
         json.dump(obj, f, ensure_ascii=False, indent=2)
-    _last_status["text"] = text
-    _last_status["meta"] = meta
+    _precomputed["snapshot_etag"] = r.headers.get("ETag")
+    return obj
+
+def _compute_status(st: dict, sims: int, seed: int):
+    # pulp/numpy chỉ được import khi thực sự tính (job nền), bot bắt đầu polling ngay.
+    # Xác suất lấy từ entry cache thường (dùng chung với `eplbot status`); SIMS_FILE được làm mới riêng.
+    from .ilp_check import guaranteed_top4, guaranteed_safe
+    from .cache import cached_probabilities
+    L = League.from_state(st)
+    flags_top4 = {t: guaranteed_top4(L, t) for t in L.teams}
+    flags_safe = {t: guaranteed_safe(L, t) for t in L.teams}
+    probs_top4, probs_safe, _, _, _, hit = cached_probabilities(L, sims=sims, seed=seed, cache=_prob_cache)
+    txt = _format_table_text(L, probs_top4, probs_safe, flags_top4, flags_safe)
+    meta = {
+        "timestamp": int(time.time()),
+        "sims": sims,
+        "seed": seed,
+        "results_count": len(st.get("results", [])),
+        "fingerprint": _state_fingerprint(st),
+        "cache": "off" if _prob_cache is None else ("hit" if hit else "miss"),
+    }
+    if _prob_cache is not None:
+        log.info("probability cache %s (hits=%d, misses=%d)", meta["cache"], _prob_cache.hits, _prob_cache.misses)
+    return txt, _format_table_text(L), meta
+
+def _refresh_sims_file(st: dict, sims: int, seed: int) -> None:
+    """Ma trận sims cho /whatif, /bigmatches: chỉ tính lại (qua store incremental) khi SIMS_FILE thuộc state cũ."""
+    from .sim import incremental_probabilities
+    L = League.from_state(st)
+    try:
+        with open(SIMS_FILE + ".json", "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        if (meta.get("fingerprint"), meta.get("sims"), meta.get("seed")) == (L.fingerprint(), sims, seed):
+            return
+    except (OSError, ValueError):
+        pass
+    incremental_probabilities(L, sims=sims, seed=seed, store_path=SIMS_FILE)
+
+def _precompute_once() -> bool:
+    """Chạy đồng bộ (trong thread): tính lại nếu state/snapshot đổi. Trả True nếu có tính lại.
+    Lỗi tải snapshot chỉ được in ra, không chặn việc tính lại từ state."""
+    with _precompute_lock:
+        return _precompute_locked()
+
+def _precompute_locked() -> bool:
+    st = load_state(STATE_PATH)
+    key = (_state_fingerprint(st), SNAPSHOT_URL)
+    changed = False
+    if SNAPSHOT_URL:
+        try:
+            obj = _fetch_snapshot_if_changed()
+        except Exception as e:  # mạng/HTTP lỗi: giữ snapshot cũ, thử lại ở lần chạy sau
+            log.warning("snapshot fetch error: %s", e)
+            obj = None
+        if obj is not None:
+            _precomputed["snapshot"] = obj
+            changed = True
+    else:
+        stamp = _local_snapshot_stamp()
+        if stamp != _precomputed["snapshot_stamp"]:
+            _precomputed["snapshot"] = _load_snapshot_local()
+            _precomputed["snapshot_stamp"] = stamp
+            changed = True
+    if key == _precomputed["key"]:
+        return changed
+    if st.get("teams"):
+        txt, table_txt, meta = _compute_status(st, PRECOMPUTE_SIMS, PRECOMPUTE_SEED)
+        _precomputed.update(status_text=txt, table_text=table_txt, meta=meta)
+        _save_cache(txt, meta)
+        _refresh_sims_file(st, PRECOMPUTE_SIMS, PRECOMPUTE_SEED)
+    _precomputed["key"] = key
+    _precomputed["computed_at"] = time.time()
+    return True
+
+async def precompute_job(context: ContextTypes.DEFAULT_TYPE):
+    try:
+        await asyncio.to_thread(_precompute_once)
+    except Exception:
+        log.exception("precompute error")
+
+def _staleness_line(st: dict = None) -> str:
+    if _precomputed["computed_at"] is None:
+        return ""
+    age = int(time.time() - _precomputed["computed_at"])
+    line = f"\nTính sẵn {age}s trước."
+    if _precomputed["meta"] and _precomputed["meta"].get("cache") == "hit":
+        line += " (từ cache)"
+    if st is not None and _precomputed["meta"] and _precomputed["meta"]["fingerprint"] != _state_fingerprint(st):
+        line += " ⚠️ State đã thay đổi, đang tính lại…"
+    return line
+
+def _request_precompute(context: ContextTypes.DEFAULT_TYPE):
+    if context.job_queue is not None:
+        context.job_queue.run_once(precompute_job, 0)
 
 def parse_teams_arg(arg: str) -> List[str]:
     parts = [p.strip() for p in arg.replace("\n", ",").split(",")]
@@ -131,6 +270,9 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
         "/result <home>;<away>;<hg>;<ag>\n"
         "/status [sims] (mặc định 20000)\n"
         "/table\n"
+        "/whatif <home>;<away>;<H|D|A>[, ...]  (xác suất có điều kiện từ sims lưu sẵn)\n"
+        "/bigmatches [n]  (các trận ảnh hưởng lớn nhất tới xác suất)\n"
+        "/trend <team>  (diễn biến xác suất qua các snapshot)\n"
         "/fixtures  (liệt kê một số cặp còn lại)\n"
         "/sync <provider> <season>  (provider = football-data | api-football)\n"
         "/teams",
@@ -192,6 +334,7 @@ async def result_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text(f"Record error: {e}")
         return
     save_state(L.to_state(), path=STATE_PATH)
+    _request_precompute(context)
     await update.message.reply_text(f"Recorded: {home} {hg}-{ag} {away}")
 
 def _format_table_text(L: League, probs_top4=None, probs_safe=None, flags_top4=None, flags_safe=None) -> str:
@@ -227,31 +370,109 @@ def _format_table_text(L: League, probs_top4=None, probs_safe=None, flags_top4=N
     return "<pre>" + "\n".join(lines) + "</pre>"
 
 async def status_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    sims = 20000
+    sims = None
     if context.args:
         try:
             sims = int(context.args[0])
         except Exception:
             pass
 
-    st = load_state(STATE_PATH); L = League.from_state(st)
-    flags_top4 = {t: guaranteed_top4(L, t) for t in L.teams}
-    flags_safe = {t: guaranteed_safe(L, t) for t in L.teams}
-    probs_top4, probs_safe = estimate_probabilities(L, sims=sims, seed=12345)
+    st = load_state(STATE_PATH)
+    if sims is None or sims == PRECOMPUTE_SIMS:
+        if _precomputed["meta"] is None:  # bot vừa khởi động: chạy precompute ngay (trong thread, có lock)
+            await asyncio.to_thread(_precompute_once)
+        pre = _precomputed["meta"]
+        if pre:
+            if pre["fingerprint"] != _state_fingerprint(st):
+                _request_precompute(context)
+            await update.message.reply_text(_precomputed["status_text"] + _staleness_line(st), parse_mode=ParseMode.HTML)
+            return
 
-    txt = _format_table_text(L, probs_top4, probs_safe, flags_top4, flags_safe)
+    # sims khác mặc định: tính trong thread; SIMS_FILE chỉ do precompute ghi
+    txt, _, meta = await asyncio.to_thread(_compute_status, st, sims or PRECOMPUTE_SIMS, PRECOMPUTE_SEED)
     await update.message.reply_text(txt, parse_mode=ParseMode.HTML)
-
-    meta = {
-        "timestamp": int(time.time()),
-        "sims": sims,
-        "seed": 12345,
-        "results_count": len(st.get("results", [])),
-        "fingerprint": _state_fingerprint(st),
-    }
     _save_cache(txt, meta)
 
 
+async def whatif_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    from .sim import load_outcomes, parse_pin, conditional_probabilities
+    if not context.args:
+        await update.message.reply_text("Usage: /whatif Home;Away;H|D|A[, Home;Away;H|D|A ...]")
+        return
+    try:
+        data, meta = load_outcomes(SIMS_FILE)
+    except FileNotFoundError:
+        await update.message.reply_text("Chưa có sims lưu sẵn. Hãy gọi /status trước.")
+        return
+    except ValueError:
+        await update.message.reply_text("Sims lưu sẵn đang được ghi lại, thử lại sau ít giây.")
+        return
+    try:
+        pins = [parse_pin(x) for x in " ".join(context.args).split(",") if x.strip()]
+        base_top4, base_safe, _ = conditional_probabilities(data, meta, [])
+        p4, ps, n = conditional_probabilities(data, meta, pins)
+    except Exception as e:
+        await update.message.reply_text(f"Whatif error: {e}")
+        return
+    lines = [f"{'Team':<28}{'%Top4':>7}{'Δ':>6}{'%Safe':>7}{'Δ':>6}"]
+    for t in sorted(meta["teams"], key=lambda t: (-p4[t], -ps[t])):
+        lines.append(f"{t:<28}{100*p4[t]:>7.1f}{100*(p4[t]-base_top4[t]):>+6.1f}"
+                     f"{100*ps[t]:>7.1f}{100*(ps[t]-base_safe[t]):>+6.1f}")
+    note = f"\n{n}/{meta['sims']} sims khớp."
+    st = load_state(STATE_PATH)
+    if meta["fingerprint"] != League.from_state(st).fingerprint():
+        note += " ⚠️ State đã thay đổi so với sims lưu sẵn."
+    await update.message.reply_text("<pre>" + "\n".join(lines) + "</pre>" + note, parse_mode=ParseMode.HTML)
+
+async def bigmatches_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    from .sim import load_outcomes, fixture_leverage, summarize_leverage
+    top = 8
+    if context.args:
+        try:
+            top = int(context.args[0])
+        except Exception:
+            pass
+    try:
+        data, meta = load_outcomes(SIMS_FILE)
+    except FileNotFoundError:
+        await update.message.reply_text("Chưa có sims lưu sẵn. Hãy gọi /status trước.")
+        return
+    except ValueError:
+        await update.message.reply_text("Sims lưu sẵn đang được ghi lại, thử lại sau ít giây.")
+        return
+    # one NumPy pass over every stored sim: keep it off the event loop
+    lev = await asyncio.to_thread(lambda: summarize_leverage(fixture_leverage(data, meta), top=top, min_swing=0.05))
+    if not lev:
+        await update.message.reply_text("No remaining fixtures.")
+        return
+    lines = []
+    for i, f in enumerate(lev, start=1):
+        lines.append(f"{i}. {f['home']} vs {f['away']}  (leverage {f['leverage']:.2f})")
+        for t in f["teams"][:3]:
+            p4 = "/".join(f"{100*x:.0f}" if x is not None else "-" for x in t["top4"])
+            ps = "/".join(f"{100*x:.0f}" if x is not None else "-" for x in t["safe"])
+            lines.append(f"   {t['team']}: Top4 {p4} | Safe {ps}")
+    await update.message.reply_text("<pre>" + "\n".join(lines) + "</pre>\n(% nếu H / D / A)", parse_mode=ParseMode.HTML)
+
+async def trend_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    from .history import read_history, team_trend
+    if not context.args:
+        await update.message.reply_text("Usage: /trend <team>")
+        return
+    query = " ".join(context.args).strip().lower()
+    _, teams = read_history(HISTORY_FILE)
+    matches = [t for t in teams if t.lower() == query] or [t for t in teams if query in t.lower()]
+    if len(matches) != 1:
+        await update.message.reply_text("Không tìm thấy đội (hoặc chưa có history)." if not matches
+                                        else "Nhiều đội khớp: " + ", ".join(matches))
+        return
+    rows = team_trend(HISTORY_FILE, matches[0])[-15:]
+    lines = [f"{'Date':<12}{'Res':>4}{'Pts':>5}{'%Top4':>7}{'%Safe':>7}"]
+    for r in rows:
+        lines.append(f"{time.strftime('%d/%m %H:%M', time.localtime(r['generated_at'])):<12}{r['results_count']:>4}"
+                     f"{r['points']:>5}{100*r['probTop4']:>7.1f}{100*r['probSafe']:>7.1f}")
+    await update.message.reply_text(f"{matches[0]}\n<pre>" + "\n".join(lines) + "</pre>", parse_mode=ParseMode.HTML)
+
 async def laststatus_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not _last_status["text"]:
         await update.message.reply_text("Chưa có kết quả nào được cache. Hãy gọi /status trước.")
@@ -260,7 +481,12 @@ async def laststatus_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 
 async def table_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    st = load_state(STATE_PATH); L = League.from_state(st)
+    st = load_state(STATE_PATH)
+    if _precomputed["table_text"] and _precomputed["meta"]["fingerprint"] == _state_fingerprint(st):
+        await update.message.reply_text(_precomputed["table_text"] + _staleness_line(st))
+        return
+    _request_precompute(context)
+    L = League.from_state(st)
     txt = _format_table_text(L)
     await update.message.reply_text(txt)
 
@@ -295,10 +521,10 @@ async def sync_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
     try:
         if provider_name == "football-data":
             provider = FootballDataProvider()
-            matches = provider.finished_matches(season=season)
+            matches = provider.season_matches(season=season)
         elif provider_name == "api-football":
             provider = ApiFootballProvider()
-            matches = provider.finished_matches(season=season)
+            matches = provider.season_matches(season=season)
         else:
             await update.message.reply_text("Provider không hợp lệ.")
             return
@@ -307,14 +533,17 @@ async def sync_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
 
     fetched = len(matches)
-    added = merge_finished_matches(L, matches)
+    added, _ = merge_season(L, matches)
     save_state(L.to_state(), path=STATE_PATH)
+    if added:
+        _request_precompute(context)
     await update.message.reply_text(f"Fetched {fetched} matches from {provider_name}. Added {added}.")
 
 def main():
     token = os.environ.get("TELEGRAM_TOKEN")
     if not token:
         raise RuntimeError("Please set TELEGRAM_TOKEN environment variable")
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(levelname)s %(message)s")
     app = Application.builder().token(token).build()
     app.add_handler(CommandHandler("start", start))
     app.add_handler(CommandHandler("init", init_cmd))
@@ -326,8 +555,16 @@ def main():
     app.add_handler(CommandHandler("teams", teams_cmd))
     app.add_handler(CommandHandler("sync", sync_cmd))
     app.add_handler(CommandHandler("laststatus", laststatus_cmd))
+    app.add_handler(CommandHandler("whatif", whatif_cmd))
+    app.add_handler(CommandHandler("bigmatches", bigmatches_cmd))
+    app.add_handler(CommandHandler("trend", trend_cmd))
     app.add_handler(CommandHandler("usesnapshot", usesnapshot_cmd))
     app.add_handler(CommandHandler("refreshsnapshot", refreshsnapshot_cmd))
+    _load_cache()
+    if app.job_queue is not None:
+        app.job_queue.run_repeating(precompute_job, interval=PRECOMPUTE_INTERVAL, first=0)
+    else:
+        log.warning("JobQueue không khả dụng (cài python-telegram-bot[job-queue]); bỏ qua precompute nền.")
     app.run_polling(close_loop=False)
 
 if __name__ == "__main__":